@@ -0,0 +1,58 @@
+"""Measure how many genomes per second are compiled to programs, with and without memoized type checks.
+
+Run from the repository root with `python -m benchmarks.compile_throughput`.
+"""
+import random
+import time
+
+import numpy as np
+import pytypes
+
+import push4.lang.expr
+import push4.lang.hof
+import push4.lang.push
+import push4.lang.reify
+from push4.gp.soup import CoreSoup
+from push4.gp.spawn import Spawner, genome_to_push_code
+from push4.lang import types
+from push4.lang.push import Push, NodeTable, ClosureCache
+
+N_GENOMES = 300
+GENOME_SIZE = (20, 100)
+
+
+def use_pytypes(memoized: bool):
+    """Point the modules that type check expressions at the memoized or the plain pytypes functions."""
+    source = types if memoized else pytypes
+    for module in [push4.lang.expr, push4.lang.hof, push4.lang.push]:
+        module.is_subtype = source.is_subtype
+    for module in [push4.lang.push, push4.lang.reify]:
+        module.get_Generic_itemtype = source.get_Generic_itemtype
+
+
+def compile_all(push_codes) -> float:
+    # Each run compiles into new tables, so it does not reuse nodes and closures compiled by earlier runs.
+    node_table, closure_cache = NodeTable(), ClosureCache()
+    start = time.time()
+    for push_code in push_codes:
+        Push(node_table=node_table, closure_cache=closure_cache).compile(push_code, int)
+    return len(push_codes) / (time.time() - start)
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    np.random.seed(0)
+    spawner = Spawner(CoreSoup().register_input("x", int).register_input("s", str))
+    push_codes = [genome_to_push_code(spawner.spawn_genome(*GENOME_SIZE)) for _ in range(N_GENOMES)]
+
+    use_pytypes(memoized=False)
+    plain = compile_all(push_codes)
+    use_pytypes(memoized=True)
+    types.cache_clear()
+    memoized = compile_all(push_codes)
+
+    print("Genomes per second, pytypes:  {:.1f}".format(plain))
+    print("Genomes per second, memoized: {:.1f}".format(memoized))
+    print("Speedup: {:.1f}x".format(memoized / plain))
+    for name, info in types.cache_info().items():
+        print("{n}: {h} hits, {m} misses".format(n=name, h=info.hits, m=info.misses))
@@ -0,0 +1,24 @@
+"""Time the translation of Plush genomes to push code as genomes get longer.
+
+Run from the repository root with `python -m benchmarks.genome_translation`.
+"""
+import random
+import timeit
+
+import numpy as np
+
+from push4.gp.soup import CoreSoup
+from push4.gp.spawn import Spawner, genome_to_push_code
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    np.random.seed(0)
+    spawner = Spawner(CoreSoup().register_input("x", int))
+
+    print("Genes\t\tSeconds per genome\t\tMicroseconds per gene")
+    for size in [10, 100, 1000, 10000]:
+        genome = spawner.spawn_genome_of_size(size)
+        number = max(1, 10000 // size)
+        seconds = timeit.timeit(lambda: genome_to_push_code(genome), number=number) / number
+        print("{n}\t\t{s:.6f}\t\t\t{u:.3f}".format(n=size, s=seconds, u=seconds / size * 1e6))
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import sys
+import argparse
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any
 
@@ -8,7 +8,10 @@ import numpy as np
 import pandas as pd
 
 from push4.gp.evolution import GeneticAlgorithm
-from push4.gp.selection import Lexicase
+from push4.gp.parallel import ParallelContext
+from push4.gp.population import FitnessCache
+from push4.gp.racing import accepts_threshold, race
+from push4.gp.selection import Lexicase, DownsampledLexicase
 from push4.gp.simplification import GenomeSimplifier
 from push4.gp.soup import Soup, CoreSoup, GeneToken
 from push4.gp.spawn import Spawner, genome_to_push_code
@@ -76,8 +79,36 @@ class Problem(ABC):
         random_cases = all_random_cases.sample(n=n_random_cases)
         return pd.concat([edge_cases, random_cases]).to_dict('records')
 
-    def train_error(self, program: Dag) -> np.array:
-        return self.error_fn(program, self.training_cases)
+    def __getstate__(self):
+        # Parallel workers must evaluate on the training cases sampled by the main process.
+        self.training_cases
+        return self.__dict__
+
+    def input_columns(self, cases: List[Dict]) -> Dict[str, List]:
+        """Column oriented program inputs, as taken by `Dag.eval_batch`."""
+        return {nm: [case[nm] for case in cases] for nm in self.arg_names}
+
+    def eval_in_chunks(self, program: Dag, cases: List[Dict], chunk_size: int = 10):
+        """Yield each case with the program's output on it and whether the evaluation failed.
+
+        The program is evaluated on a chunk of cases at a time, when the first case of the
+        chunk is reached. Error functions which abort stop consuming the cases, so the
+        remaining chunks are never evaluated.
+        """
+        for start in range(0, len(cases), chunk_size):
+            chunk = cases[start:start + chunk_size]
+            y_preds, failed = program.eval_batch(self.input_columns(chunk), len(chunk))
+            yield from zip(chunk, y_preds, failed)
+
+    def train_error(self, program: Dag, cases: np.ndarray = None, threshold: float = None) -> np.array:
+        """Errors on the training cases, or only on the training cases with the given indices.
+
+        The threshold is passed on to error functions which can abort evaluations.
+        """
+        training_cases = self.training_cases if cases is None else [self.training_cases[ndx] for ndx in cases]
+        if threshold is not None and accepts_threshold(self.error_fn):
+            return self.error_fn(program, training_cases, threshold=threshold)
+        return self.error_fn(program, training_cases)
 
     def test_error(self, program: Dag) -> np.array:
         return self.error_fn(program, self.test_cases)
@@ -105,24 +136,18 @@ class CompareStringLengths(Problem):
         )
 
     def error_fn(self, program: Dag, cases: List[Dict]) -> np.array:
+        if program is None:
+            return np.full(2 * len(cases), penalty)
+        inputs = {k: [float_to_empty_str(v) for v in col] for k, col in self.input_columns(cases).items()}
+        y_preds, failed = program.eval_batch(inputs)
         errors = []
-        for case in cases:
-            if program is None:
+        for case, y_pred, is_failed in zip(cases, y_preds, failed):
+            if is_failed:
                 errors.append(penalty)
                 errors.append(penalty)
             else:
-                y_true = case["output1"]
-                inputs = case.copy()
-                del inputs["output1"]
-                inputs = {k: float_to_empty_str(v) for k, v in inputs.items()}
-                try:
-                    y_pred = program.eval(**inputs)
-                    errors.append(float(not isinstance(y_pred, bool)))
-                    errors.append(float(not (bool(y_pred) == y_true)))
-                except Exception as e:
-                    # print(e)
-                    errors.append(penalty)
-                    errors.append(penalty)
+                errors.append(float(not isinstance(y_pred, bool)))
+                errors.append(float(not (bool(y_pred) == case["output1"])))
         return np.array(errors)
 
 
@@ -140,21 +165,15 @@ class Median(Problem):
         )
 
     def error_fn(self, program: Dag, cases: List[Dict]) -> np.array:
+        if program is None:
+            return np.full(len(cases), penalty)
+        _, failed = program.eval_batch(self.input_columns(cases))
         errors = []
-        for case in cases:
-            if program is None:
+        for case, y_pred, is_failed in zip(cases, program.batch_stdout(), failed):
+            if is_failed:
                 errors.append(penalty)
             else:
-                y_true = str(case["output1"])
-                inputs = case.copy()
-                del inputs["output1"]
-                try:
-                    program.eval(**inputs)
-                    y_pred = program.stdout()
-                    errors.append(float(not y_pred == y_true))
-                except Exception as e:
-                    # print(e)
-                    errors.append(penalty)
+                errors.append(float(not y_pred == str(case["output1"])))
         return np.array(errors)
 
 
@@ -171,21 +190,16 @@ class NumberIO(Problem):
         )
 
     def error_fn(self, program: Dag, cases: List[Dict]) -> np.array:
+        if program is None:
+            return np.full(len(cases), penalty)
+        _, failed = program.eval_batch(self.input_columns(cases))
         errors = []
-        for case in cases:
-            if program is None:
+        for case, stdout, is_failed in zip(cases, program.batch_stdout(), failed):
+            if is_failed:
                 errors.append(penalty)
             else:
                 y_true = str(case["output1"])[:10]  # Prevents rounding errors.
-                inputs = case.copy()
-                del inputs["output1"]
-                try:
-                    program.eval(**inputs)
-                    y_pred = program.stdout()[:10]
-                    errors.append(damerau_levenshtein_distance(y_true, y_pred))
-                except Exception as e:
-                    # print(e)
-                    errors.append(penalty)
+                errors.append(damerau_levenshtein_distance(y_true, stdout[:10]))
         return np.array(errors)
 
 
@@ -202,27 +216,18 @@ class ReplaceSpaceWithNewline(Problem):
         )
 
     def error_fn(self, program: Dag, cases: List[Dict]) -> np.array:
+        if program is None:
+            return np.full(2 * len(cases), penalty)
+        cases = [{k: float_to_empty_str(v) for k, v in case.items()} for case in cases]
+        y_preds, failed = program.eval_batch(self.input_columns(cases))
         errors = []
-        for case in cases:
-            case = {k: float_to_empty_str(v) for k, v in case.items()}
-            if program is None:
+        for case, y_pred, y_pred_stdout, is_failed in zip(cases, y_preds, program.batch_stdout(), failed):
+            if is_failed:
                 errors.append(penalty)
                 errors.append(penalty)
             else:
-                y_true_stdout = case["output1"]
-                y_true = case["output2"]
-                int_err = penalty
-                stdout_err = penalty
-                try:
-                    y_pred = program.eval(input1=case["input1"])
-                    y_pred_stdout = program.stdout()
-                    int_err = abs(y_true - y_pred)
-                    stdout_err = damerau_levenshtein_distance(y_true_stdout, escape_str(y_pred_stdout))
-                except Exception as e:
-                    # print(e)
-                    ...
-                errors.append(int_err)
-                errors.append(stdout_err)
+                errors.append(abs(case["output2"] - y_pred))
+                errors.append(damerau_levenshtein_distance(case["output1"], escape_str(y_pred_stdout)))
         return np.array(errors)
 
 
@@ -241,21 +246,15 @@ class Smallest(Problem):
         )
 
     def error_fn(self, program: Dag, cases: List[Dict]) -> np.array:
+        if program is None:
+            return np.full(len(cases), penalty)
+        _, failed = program.eval_batch(self.input_columns(cases))
         errors = []
-        for case in cases:
-            if program is None:
+        for case, y_pred, is_failed in zip(cases, program.batch_stdout(), failed):
+            if is_failed:
                 errors.append(penalty)
             else:
-                y_true = str(case["output1"])
-                inputs = case.copy()
-                del inputs["output1"]
-                try:
-                    program.eval(**inputs)
-                    y_pred = program.stdout()
-                    errors.append(float(not y_pred == y_true))
-                except Exception as e:
-                    # print(e)
-                    errors.append(penalty)
+                errors.append(float(not y_pred == str(case["output1"])))
         return np.array(errors)
 
 
@@ -280,18 +279,15 @@ class VectorAverage(Problem):
         )
 
     def error_fn(self, program: Dag, cases: List[Dict]) -> np.array:
+        if program is None:
+            return np.full(len(cases), penalty)
+        y_preds, failed = program.eval_batch(self.input_columns(cases))
         errors = []
-        for case in cases:
-            if program is None:
+        for case, y_pred, is_failed in zip(cases, y_preds, failed):
+            if is_failed:
                 errors.append(penalty)
             else:
-                y_true = round(case["output1"], 4)
-                try:
-                    y_pred = round(program.eval(input1=case["input1"]), 4)
-                    errors.append(abs(y_pred - y_true))
-                except Exception as e:
-                    print(e)
-                    errors.append(penalty)
+                errors.append(abs(round(y_pred, 4) - round(case["output1"], 4)))
         return np.array(errors)
 
 
@@ -319,20 +315,15 @@ class NegativeToZero(Problem):
             .register_input("input1", List[int])
         )
 
-    def error_fn(self, program: Dag, cases: List[Dict]) -> np.array:
-        errors = []
-        for case in cases:
-            if program is None:
-                errors.append(penalty)
-            else:
-                y_true = case["output1"]
-                try:
-                    y_pred = program.eval(input1=case["input1"])
-                    errors.append(damerau_levenshtein_distance(y_true, y_pred))
-                except Exception as e:
-                    print(e)
-                    errors.append(penalty)
-        return np.array(errors)
+    def error_fn(self, program: Dag, cases: List[Dict], threshold: float = None) -> np.array:
+        if program is None:
+            return np.full(len(cases), penalty)
+        # The program is only evaluated, and its edit distances computed, until the total error exceeds the threshold.
+        errors = (
+            penalty if is_failed else damerau_levenshtein_distance(case["output1"], y_pred)
+            for case, y_pred, is_failed in self.eval_in_chunks(program, cases)
+        )
+        return race(errors, len(cases), threshold)
 
 
 # class StringLengthBackwards(Problem):
@@ -363,12 +354,20 @@ problems = {
 }
 
 
-def run(problem: Problem):
+def run(problem: Problem,
+        downsample_rate: float = None,
+        parallel: bool = False,
+        cache: bool = False,
+        racing: bool = False):
     # The spawner which will generate random genes and genomes.
     spawner = Spawner(problem.soup())
 
-    # The parent selector.
-    selector = Lexicase(epsilon=False)
+    # The parent selector. If a downsample rate is given, evaluates each generation on that
+    # fraction of the training cases.
+    if downsample_rate is None:
+        selector = Lexicase(epsilon=False)
+    else:
+        selector = DownsampledLexicase(downsample_rate=downsample_rate, epsilon=False)
 
     # The evolver
     evo = GeneticAlgorithm(
@@ -380,7 +379,12 @@ def run(problem: Problem):
         ]),
         population_size=1000,
         max_generations=300,
-        initial_genome_size=(10, 60)
+        initial_genome_size=(10, 60),
+        parallel_context=ParallelContext() if parallel else None,
+        fitness_cache=FitnessCache() if cache else None,
+        n_training_cases=len(problem.training_cases),
+        # train_error takes a threshold for all problems, but only some error functions use it.
+        racing=racing and accepts_threshold(problem.error_fn)
     )
 
     simplifier = GenomeSimplifier(problem.train_error, problem.output_type)
@@ -398,9 +402,16 @@ def run(problem: Problem):
 
 
 if __name__ == "__main__":
-    problem_name = sys.argv[1]
-    problem = problems[problem_name]
-    run(problem)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("problem", choices=list(problems.keys()))
+    parser.add_argument("--downsample-rate", type=float, default=None,
+                        help="Select parents by down-sampled lexicase on this fraction of the training cases.")
+    parser.add_argument("--parallel", action="store_true", help="Evaluate the population in worker processes.")
+    parser.add_argument("--cache", action="store_true", help="Reuse the errors of previously evaluated programs.")
+    parser.add_argument("--racing", action="store_true",
+                        help="Abort evaluations of programs which are not expected to be selected.")
+    args = parser.parse_args()
+    run(problems[args.problem], args.downsample_rate, args.parallel, args.cache, args.racing)
 
     # genome = [
     #     Constant([1, 2, 3], List[int]),
@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import Iterator, Sequence, Tuple, List, Any, Dict
 
 import numpy as np
-from numpy.random import choice
+from numpy.random import choice, random
 from pyrsistent import v, m, pvector, PVector, PClass, field
 
 
@@ -75,39 +75,84 @@ class POMap(PClass):
 
 
 class DiscreteProbDistrib:
-    """Discrete Probability Distribution."""
+    """Discrete Probability Distribution.
 
-    __slots__ = ["elements", "_total", "_raw_probabilities", "_normalized_probabilities"]
+    Samples in constant time with Vose's alias method. The alias table is built
+    on the first sample after elements are added.
+    """
+
+    __slots__ = ["elements", "_total", "_raw_probabilities", "_alias_prob", "_alias", "_alias_arrays"]
 
     def __init__(self):
         self.elements = []
         self._total = 0.0
         self._raw_probabilities = []
-        self._normalize()
-
-    def _normalize(self):
-        self._normalized_probabilities = np.array(self._raw_probabilities) / self._total
+        self._alias_prob = None
+        self._alias = None
+        self._alias_arrays = None
 
     def add(self, el, p):
         """Add an element with a relative probability."""
         self.elements.append(el)
         self._total += float(p)
         self._raw_probabilities.append(p)
-        self._normalize()
+        self._alias_prob = None
         return self
 
     def size(self):
         """Return the number of elements in the distribution."""
         return len(self.elements)
 
+    def probabilities(self) -> np.ndarray:
+        """Return the normalized probability of each element."""
+        return np.array(self._raw_probabilities, dtype=float) / self._total
+
+    def _build_alias_table(self):
+        n = self.size()
+        scaled = list(self.probabilities() * n)
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [ndx for ndx, sp in enumerate(scaled) if sp < 1.0]
+        large = [ndx for ndx, sp in enumerate(scaled) if sp >= 1.0]
+        while small and large:
+            s = small.pop()
+            lg = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = lg
+            scaled[lg] = (scaled[lg] + scaled[s]) - 1.0
+            if scaled[lg] < 1.0:
+                small.append(lg)
+            else:
+                large.append(lg)
+        # Whatever remains has a probability of 1 up to rounding error.
+        self._alias_prob = prob
+        self._alias = alias
+        self._alias_arrays = (np.array(prob), np.array(alias))
+
+    def sample_index(self) -> int:
+        """Return the index of an element sampled from the distribution."""
+        if self._alias_prob is None:
+            self._build_alias_table()
+        n = len(self._alias_prob)
+        u = random() * n
+        ndx = min(int(u), n - 1)
+        if u - ndx < self._alias_prob[ndx]:
+            return ndx
+        return self._alias[ndx]
+
     def sample(self):
         """Return a sample from the distribution."""
         if self.size() == 1:
             return self.elements[0]
-        return choice(self.elements, p=self._normalized_probabilities)
-
-    def sample_n(self, n: int = 1, replace: bool = True):
-        """Return n samples from the distribution."""
-        if self.size() == 1 and replace:
-            return [self.elements[0]] * n
-        return choice(self.elements, n, replace, self._normalized_probabilities)
+        return self.elements[self.sample_index()]
+
+    def sample_n(self, n: int = 1, replace: bool = True) -> np.ndarray:
+        """Return the indices of n elements sampled from the distribution."""
+        if not replace:
+            return choice(self.size(), n, False, self.probabilities())
+        if self._alias_prob is None:
+            self._build_alias_table()
+        prob, alias = self._alias_arrays
+        u = random(n) * len(prob)
+        ndxs = np.minimum(u.astype(int), len(prob) - 1)
+        return np.where(u - ndxs < prob[ndxs], ndxs, alias[ndxs])
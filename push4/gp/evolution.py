@@ -4,7 +4,10 @@ from typing import Callable, Tuple
 import numpy as np
 
 from push4.gp.individual import Individual
-from push4.gp.population import Population
+from push4.gp.instrumentation import Instrumentation, NO_INSTRUMENTATION
+from push4.gp.parallel import ParallelContext
+from push4.gp.population import Population, FitnessCache
+from push4.gp.racing import accepts_threshold
 from push4.gp.selection import Selector
 from push4.gp.spawn import Spawner
 from push4.gp.variation import VariationOperator
@@ -13,7 +16,7 @@ from push4.utils import escape
 
 
 def _spawn_individual(spawner, genome_size, output_type: type, *args):
-    return Individual(spawner.spawn_genome(*genome_size), output_type)
+    return Individual(spawner.spawn_genome(*genome_size), output_type, units=spawner.soup.units)
 
 
 class Evolver(ABC):
@@ -25,7 +28,13 @@ class Evolver(ABC):
                  variation: VariationOperator,
                  population_size: int,
                  max_generations: int,
-                 initial_genome_size: Tuple[int, int]):
+                 initial_genome_size: Tuple[int, int],
+                 parallel_context: ParallelContext = None,
+                 fitness_cache: FitnessCache = None,
+                 n_training_cases: int = None,
+                 instrumentation: Instrumentation = None,
+                 racing: bool = None,
+                 racing_threshold: Callable[[np.ndarray], float] = np.max):
         self.error_function = error_function
         self.spawner = spawner
         self.selector = selector
@@ -36,8 +45,21 @@ class Evolver(ABC):
         self.population = None
         self.generation = 0
         self.best_seen = None
-
-        # TODO: Add ParallelContext
+        self.parallel_context = parallel_context
+        self.fitness_cache = fitness_cache
+        # Required for selectors which evaluate Individuals on a sample of the training cases.
+        self.n_training_cases = n_training_cases
+        # Error functions which take a threshold may abort evaluations of Individuals whose total
+        # error is above it. Set by `step`, and None until the first generation has been selected.
+        self.racing = accepts_threshold(error_function) if racing is None else racing
+        # Maps the total errors of the selected parents to the threshold. Lexicase selects specialists
+        # by their errors on single cases, and a child of a specialist may be selected despite a total
+        # error above every parent's. A looser threshold, such as a multiple of the maximum, aborts
+        # fewer of them.
+        self.racing_threshold = racing_threshold
+        self.error_threshold = None
+        self.n_aborted_errors = 0
+        self.instrumentation = NO_INSTRUMENTATION if instrumentation is None else instrumentation
 
     def init_population(self, output_type: type):
         """Initialize the population."""
@@ -56,20 +78,60 @@ class Evolver(ABC):
         pass
 
     def _full_step(self, output_type) -> bool:
+        with self.instrumentation.phase("generation"):
+            keep_going = self._evaluate_and_step(output_type)
+        self.instrumentation.end_generation(self.generation)
+        return keep_going
+
+    def _evaluate_and_step(self, output_type) -> bool:
         self.generation += 1
-        self.population.evaluate(self.error_function)
+        instrumentation = self.instrumentation
+        cache = self.fitness_cache
+        if cache is not None:
+            hits_before, misses_before = cache.hits, cache.misses
+        cases = None
+        if self.n_training_cases is not None:
+            cases = self.selector.sample_cases(self.n_training_cases)
+        threshold = self.error_threshold if self.racing else None
+        if instrumentation.enabled:
+            self._compile_unevaluated()
+        with instrumentation.phase("evaluate"):
+            if self.parallel_context is None:
+                self.population.evaluate(self.error_function, cache, cases, threshold)
+            else:
+                self.population.p_evaluate(self.parallel_context, cache, cases, threshold)
+        self.n_aborted_errors += self.population.n_aborted_errors
+        if instrumentation.enabled:
+            self._record_population()
+            if cache is not None:
+                hits, misses = cache.hits - hits_before, cache.misses - misses_before
+                instrumentation.record("cache_hits", hits)
+                instrumentation.record("cache_misses", misses)
+                instrumentation.record("cache_hit_rate", hits / (hits + misses) if hits + misses > 0 else None)
 
         best_this_gen = self.population.best()
+        if cases is not None:
+            # Errors on different samples of cases are not comparable, so only the best
+            # Individual of the generation is checked against all cases.
+            best_this_gen = self._evaluate_on_all_cases(best_this_gen, output_type)
         if self.best_seen is None or best_this_gen.total_error < self.best_seen.total_error:
             self.best_seen = best_this_gen
 
         best_is_valid = self.best_seen.program is not None
-        print("{gn}\t\t{me}\t\t{be}\t\t{dv}\t\t{best_err}\t\t{best_code}".format(
+        cache_stats = ""
+        if cache is not None:
+            cache_stats = "{h}/{m}\t\t".format(h=cache.hits - hits_before, m=cache.misses - misses_before)
+        racing_stats = ""
+        if self.racing:
+            racing_stats = "{n}\t\t".format(n=self.population.n_aborted_errors)
+        print("{gn}\t\t{me}\t\t{be}\t\t{dv}\t\t{best_err}\t\t{cache}{racing}{best_code}".format(
             gn=round(self.generation, 3),
             me=round(self.population.median_error(), 3),
             be=round(self.population.best().total_error, 3),
             dv=round(self.population.error_diversity(), 3),
             best_err=self.best_seen.total_error,
+            cache=cache_stats,
+            racing=racing_stats,
             best_code=escape(self.best_seen.program.root.to_code()) if best_is_valid else "NA"
         ))
         # self.best_seen.program.pprint()
@@ -80,22 +142,78 @@ class Evolver(ABC):
         self.step(output_type)
         return True
 
+    def _compile_unevaluated(self):
+        """Decode and compile the unevaluated Individuals, so both are timed apart from the evaluation.
+
+        When evaluating in parallel without a cache, the workers compile the programs.
+        """
+        if self.parallel_context is not None and self.fitness_cache is None:
+            return
+        unevaluated = self.population.unevaluated
+        with self.instrumentation.phase("decode"):
+            for individual in unevaluated:
+                individual.push_code
+        with self.instrumentation.phase("compile"):
+            for individual in unevaluated:
+                individual.program
+
+    def _record_population(self):
+        instrumentation = self.instrumentation
+        population = self.population
+        instrumentation.record("n_individuals", len(population))
+        instrumentation.record("mean_genome_length", np.mean([len(i.genome) for i in population]))
+        # Only programs compiled in this process are known.
+        programs = [i.program for i in population if i.compile_trace is not None]
+        if len(programs) > 0:
+            sizes = [p.size() for p in programs if p is not None]
+            instrumentation.record("n_failed_compiles", len(programs) - len(sizes))
+            instrumentation.record("mean_program_size", np.mean(sizes) if len(sizes) > 0 else None)
+        if self.racing:
+            instrumentation.record("n_aborted_errors", population.n_aborted_errors)
+        instrumentation.record("best_error", population.best().total_error)
+
+    def _evaluate_on_all_cases(self, individual: Individual, output_type: type) -> Individual:
+        """Return a copy of the Individual evaluated on all training cases."""
+        program = individual.program
+        full = Individual(individual.genome, output_type, units=individual.units)
+        cache = self.fitness_cache
+        if cache is None:
+            full.error_vector = self.error_function(program)
+        else:
+            key = cache.key(program)
+            full.error_vector = cache.get(key)
+            if full.error_vector is None:
+                full.error_vector = self.error_function(program)
+                cache.put(key, full.error_vector)
+        return full
+
     def _is_solved(self):
         return round(self.best_seen.total_error, 6) == 0
 
     def run(self, output_type: type) -> Individual:
         """Run the algorithm until termination."""
         self.init_population(output_type)
-
-        print("Gen\t\tMedian\t\tMAD\t\tBest\t\tDiv\t\tRun Best\t\tCode")
-        while self._full_step(output_type):
-            if self.generation >= self.max_generations:
-                break
+        if self.parallel_context is not None:
+            self.parallel_context.start(self.error_function, output_type, self.spawner.soup.units)
+
+        cache_header = "Cache Hit/Miss\t\t" if self.fitness_cache is not None else ""
+        racing_header = "Aborted\t\t" if self.racing else ""
+        print("Gen\t\tMedian\t\tMAD\t\tBest\t\tDiv\t\tRun Best\t\t" + cache_header + racing_header + "Code")
+        try:
+            while self._full_step(output_type):
+                if self.generation >= self.max_generations:
+                    break
+        finally:
+            if self.parallel_context is not None:
+                self.parallel_context.close()
+            self.instrumentation.close()
 
         if self._is_solved():
             print("Solution found.")
         else:
             print("No solution found.")
+        if self.racing:
+            print("Aborted evaluations skipped {n} errors.".format(n=self.n_aborted_errors))
 
         return self.best_seen
 
@@ -108,16 +226,30 @@ class GeneticAlgorithm(Evolver):
     the Population and applying VariationOperators to them.
     """
 
-    def _make_child(self, output_type: type) -> Individual:
-        parent_genomes = [p.genome for p in self.selector.select(self.population, n=self.variation.num_parents)]
-        child_genome = self.variation.produce(parent_genomes, self.spawner)
-        return Individual(child_genome, output_type)
-
     def step(self, output_type: type):
         """Perform one generation (step) of the genetic algorithm.
         The step method assumes an evaluated Population and performs parent
         selection and variation (producing children).
         """
-        self.population = Population(
-            [self._make_child(output_type) for _ in range(self.population_size)]
-        )
+        num_parents = self.variation.num_parents
+        with self.instrumentation.phase("selection"):
+            parent_ndxs = self.selector.select_batch(
+                self.population, self.population_size * num_parents, num_parents
+            ).reshape(self.population_size, num_parents)
+            parents = [[self.population[ndx] for ndx in ndxs] for ndxs in parent_ndxs]
+            if self.racing and len(parent_ndxs) > 0 and num_parents > 0:
+                # By default, children with a higher total error than every selected parent are aborted.
+                threshold = self.racing_threshold(self.population.all_total_errors()[parent_ndxs])
+                self.error_threshold = threshold if np.isfinite(threshold) else None
+        with self.instrumentation.phase("variation"):
+            child_genomes = self.variation.produce_batch([[p.genome for p in ps] for ps in parents], self.spawner)
+            units = self.spawner.soup.units
+            children = []
+            for genome, ps in zip(child_genomes, parents):
+                child = Individual(genome, output_type, units=units)
+                if len(ps) > 0:
+                    # Only the first parent is tried. Its results are reused only if the child has the same
+                    # genome or compiles to the same program.
+                    child.inherit(ps[0])
+                children.append(child)
+        self.population = Population(children)
@@ -0,0 +1,137 @@
+"""The :mod:`genome` module defines a compact representation of genomes.
+
+A compact genome stores each gene as an integer index into the units of a
+Soup, instead of a reference to the gene itself. Constants made by an
+ErcGenerator are not units of the soup, so they are kept in a side table.
+Compact genomes are decoded into genes only to compile them.
+
+"""
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from pyrsistent import pvector, PVector
+
+from push4.gp.soup import Unit, ErcGenerator
+from push4.lang.expr import Constant
+
+
+def code_dtype(max_unit_code: int) -> np.dtype:
+    """The smallest unsigned integer type that can store unit codes up to `max_unit_code` and the ERC code."""
+    if max_unit_code < np.iinfo(np.uint16).max:
+        return np.dtype(np.uint16)
+    return np.dtype(np.uint32)
+
+
+def erc_code(dtype: np.dtype) -> int:
+    """The code of genes which take their value from the side table of constants."""
+    return np.iinfo(dtype).max
+
+
+class CompactGenome:
+    """A genome stored as an array of indices into the units of a Soup.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        The index in the soup's units of each gene. Genes whose code is
+        `erc_code(codes.dtype)` are constants made by an ErcGenerator.
+    constants : Sequence[Constant]
+        The constant of each ERC gene, in the order of the genes.
+
+    Attributes
+    ----------
+    codes : np.ndarray
+        The index in the soup's units of each gene.
+    constants : Tuple[Constant]
+        The constant of each ERC gene, in the order of the genes.
+
+    """
+
+    __slots__ = ["codes", "constants"]
+
+    def __init__(self, codes: np.ndarray, constants: Sequence[Constant] = ()):
+        self.codes = codes
+        self.constants = tuple(constants)
+
+    @classmethod
+    def encode(cls, genome: Sequence[Unit], units: Sequence[Unit]):
+        """Encode a genome whose genes are units of a soup, or constants made by its ERC generators."""
+        ndx_of_unit = {id(unit): ndx for ndx, unit in enumerate(units) if not isinstance(unit, ErcGenerator)}
+        dtype = code_dtype(len(units) - 1)
+        codes = np.empty(len(genome), dtype=dtype)
+        constants = []
+        for i, gene in enumerate(genome):
+            ndx = ndx_of_unit.get(id(gene))
+            if ndx is not None:
+                codes[i] = ndx
+            elif isinstance(gene, Constant):
+                codes[i] = erc_code(dtype)
+                constants.append(gene)
+            else:
+                raise ValueError("Gene {g} is not a unit of the soup.".format(g=gene))
+        return cls(codes, constants)
+
+    def decode(self, units: Sequence[Unit]) -> PVector:
+        """The genes of the genome, given the units of the soup it was made from."""
+        erc = erc_code(self.codes.dtype)
+        constants = iter(self.constants)
+        return pvector([next(constants) if code == erc else units[code] for code in self.codes.tolist()])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __copy__(self):
+        # Compact genomes are never modified, so copies can share them.
+        return self
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactGenome)
+                and np.array_equal(self.codes, other.codes)
+                and self.constants == other.constants)
+
+    def __repr__(self):
+        return "CompactGenome({c}, {k})".format(c=self.codes.tolist(), k=list(self.constants))
+
+
+# Codes of ERC genes in flattened compact genomes are offset by this to index a shared table of constants.
+_FLAT_CONSTANT_OFFSET = 1 << 40
+
+
+def flatten_compact(genomes: Sequence[CompactGenome],
+                    constants: List[Constant] = None) -> Tuple[np.ndarray, np.ndarray, List[Constant]]:
+    """Return the codes of all genomes in one array, the index where each genome starts, and their constants.
+
+    ERC genes are given the code `_FLAT_CONSTANT_OFFSET` plus the index of their constant, so genes can be
+    moved between genomes without their constants. If a list of `constants` is given, the constants of the
+    genomes are appended to it.
+    """
+    starts = np.zeros(len(genomes) + 1, dtype=int)
+    np.cumsum([len(g) for g in genomes], out=starts[1:])
+    codes = np.empty(starts[-1], dtype=np.int64)
+    if constants is None:
+        constants = []
+    for genome, start, end in zip(genomes, starts[:-1], starts[1:]):
+        genome_codes = codes[start:end]
+        genome_codes[:] = genome.codes
+        if len(genome.constants) > 0:
+            genome_codes[genome.codes == erc_code(genome.codes.dtype)] = (
+                _FLAT_CONSTANT_OFFSET + len(constants) + np.arange(len(genome.constants))
+            )
+            constants.extend(genome.constants)
+    return codes, starts, constants
+
+
+def unflatten_compact(codes: np.ndarray, starts: np.ndarray, constants: Sequence[Constant]) -> List[CompactGenome]:
+    """Split flattened codes back into compact genomes. Inverse of `flatten_compact`."""
+    is_erc = codes >= _FLAT_CONSTANT_OFFSET
+    erc_ndxs = np.flatnonzero(is_erc)
+    genome_constants = [constants[c] for c in (codes[erc_ndxs] - _FLAT_CONSTANT_OFFSET).tolist()]
+    # The index of the first constant of each genome.
+    constant_starts = np.searchsorted(erc_ndxs, starts)
+    dtype = code_dtype(codes[~is_erc].max() if len(erc_ndxs) < len(codes) else 0)
+    compact = codes.astype(dtype)
+    compact[erc_ndxs] = erc_code(dtype)
+    return [
+        CompactGenome(compact[starts[i]:starts[i + 1]], genome_constants[constant_starts[i]:constant_starts[i + 1]])
+        for i in range(len(starts) - 1)
+    ]
@@ -4,62 +4,154 @@ Individuals are made up of Genomes, which are the linear Push program
 representations which can be manipulated by seach algorithms.
 
 """
-from typing import Union, Sequence
+from typing import Optional, Union, Sequence
 
 import numpy as np
 from pyrsistent import pvector
 
+from push4.gp.genome import CompactGenome
+from push4.gp.soup import Unit
 from push4.gp.spawn import genome_to_push_code
 from push4.lang.dag import Dag
 from push4.lang.expr import Expression
-from push4.lang.push import Push
+from push4.lang.push import Push, CompileTrace
+from push4.lang.rewrite import simplify_dag
 
 
 Genome = Sequence[Expression]
 
+# Marks the program of a parent which was not compiled in this process.
+_NOT_COMPILED = object()
+
+
+def _same_genome(a: Union[Genome, CompactGenome], b: Union[Genome, CompactGenome]) -> bool:
+    """True if the genomes have the same genes. Genes are shared, so they are compared by identity."""
+    if a is b:
+        return True
+    if isinstance(a, CompactGenome) or isinstance(b, CompactGenome):
+        return (isinstance(a, CompactGenome) and isinstance(b, CompactGenome)
+                and np.array_equal(a.codes, b.codes)
+                and len(a.constants) == len(b.constants)
+                and all(x is y for x, y in zip(a.constants, b.constants)))
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b))
+
+
+def _same_cases(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return np.array_equal(a, b)
+
 
 class Individual:
     """An individual in an evolutionary population.
 
     Attributes
     ----------
-    genome : Genome
+    genome : Union[Genome, CompactGenome]
         The Genome of the Individual.
+    units : Sequence[Unit]
+        The units of the Soup a CompactGenome was made from. Only required
+        to decode CompactGenomes.
     error_vector : np.array
         An array of error values produced by evaluating the Individual's program.
+    error_cases : np.ndarray
+        The indices of the training cases the error vector was computed on, or
+        None if it was computed on all training cases.
     total_error : float
         The sum of all error values in the Individual's error_vector.
     error_vector_bytes:
         Hashable Byte representation of the individual's error vector.
+    compile_trace : CompileTrace
+        Snapshots of the Push interpreter taken while compiling the program.
+        Children compile incrementally from the trace of their parent.
 
     """
 
     __slots__ = [
-        "genome", "signature", "output_type", "error_vector",
-        "_push_code", "_program", "_total_error", "_error_vector_bytes"
+        "genome", "units", "signature", "output_type", "error_vector", "error_cases", "compile_trace",
+        "_parent_trace", "_parent_result", "_push_code", "_program", "_total_error", "_error_vector_bytes"
     ]
 
-    def __init__(self, genome: Genome, output_type: type):
+    def __init__(self,
+                 genome: Union[Genome, CompactGenome],
+                 output_type: type,
+                 parent_trace: CompileTrace = None,
+                 units: Sequence[Unit] = None):
         self.output_type = output_type
-        self.genome = pvector(genome)
+        self.genome = genome if isinstance(genome, CompactGenome) else pvector(genome)
+        self.units = units
+        self.compile_trace = None
+        self._parent_trace = parent_trace
+        self._parent_result = None
         self._push_code = None
         self._program = None
         self.error_vector = None
+        self.error_cases = None
         self._total_error = None
         self._error_vector_bytes = None
 
+    def inherit(self, parent):
+        """Reuse the results of the parent this Individual was produced from, where they still apply.
+
+        If the genome is the same as the parent's, the push code and program of the
+        parent are reused. The error vector of the parent is kept to be reused by
+        `reuse_parent_errors`.
+        """
+        self._parent_trace = parent.compile_trace
+        same_genome = _same_genome(self.genome, parent.genome)
+        if same_genome and parent.compile_trace is not None:
+            self._push_code = parent._push_code
+            self._program = parent._program
+            self.compile_trace = parent.compile_trace
+            self._parent_trace = None
+        if parent.error_vector is not None:
+            parent_program = parent._program if parent.compile_trace is not None else _NOT_COMPILED
+            self._parent_result = (same_genome, parent_program, parent.error_vector, parent.error_cases)
+        return self
+
+    def reuse_parent_errors(self, cases: np.ndarray = None, compile: bool = True) -> bool:
+        """Take the error vector of the parent if it is known to be the same as this Individual's.
+
+        The errors of the parent are reused if they were computed on the same `cases`,
+        and either the genomes are the same or, if `compile` is True, the programs
+        compile to the same Dag. Return True if the errors were reused.
+        """
+        if self._parent_result is None:
+            return False
+        same_genome, parent_program, error_vector, error_cases = self._parent_result
+        self._parent_result = None
+        if not _same_cases(error_cases, cases):
+            return False
+        if not same_genome:
+            if not compile or parent_program is _NOT_COMPILED:
+                return False
+            program = self.program
+            # Nodes are hash-consed, so programs which compile to the same Dag share the root node.
+            if (program is None) != (parent_program is None):
+                return False
+            if program is not None and program.root is not parent_program.root:
+                return False
+        self.error_vector = error_vector
+        self.error_cases = cases
+        return True
+
     @property
     def push_code(self):
         if self._push_code is None:
-            self._push_code = genome_to_push_code(self.genome)
+            genome = self.genome
+            if isinstance(genome, CompactGenome):
+                genome = genome.decode(self.units)
+            self._push_code = genome_to_push_code(genome)
         return self._push_code
 
     @property
     def program(self) -> Dag:
-        """Push program of individual. Taken from Plush genome."""
-        if self._program is None:
-            dag = Push().compile(self.push_code, self.output_type)
-            self._program = dag
+        """Push program of individual. Taken from Plush genome, and simplified."""
+        # Programs which fail to compile are None, so the trace marks whether the program was compiled.
+        if self.compile_trace is None:
+            dag, self.compile_trace = Push().compile_incremental(self.push_code, self.output_type, self._parent_trace)
+            self._parent_trace = None
+            self._program = simplify_dag(dag)
         return self._program
 
     @property
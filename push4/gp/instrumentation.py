@@ -0,0 +1,212 @@
+"""The :mod:`instrumentation` module records where the time of each generation of evolution goes.
+
+An Evolver given an Instrumentation times each phase of a generation, in wall
+clock and CPU time, and records counters and statistics of the Population. At
+the end of each generation, one record is written to every sink. Evolvers
+without an Instrumentation use `NO_INSTRUMENTATION`, which records nothing.
+
+"""
+import json
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import Any, IO, List, Mapping, Sequence
+
+import numpy as np
+
+
+class Sink(ABC):
+    """Destination of the records of each generation."""
+
+    @abstractmethod
+    def write(self, record: Mapping[str, Any]):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemorySink(Sink):
+    """Keeps the records in a list.
+
+    Attributes
+    ----------
+    records : List[Mapping[str, Any]]
+        The record of each generation, in order.
+
+    """
+
+    def __init__(self):
+        self.records: List[Mapping[str, Any]] = []
+
+    def write(self, record: Mapping[str, Any]):
+        self.records.append(record)
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("{v} is not JSON serializable.".format(v=value))
+
+
+class JsonlSink(Sink):
+    """Appends each record as a line of JSON to a file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def write(self, record: Mapping[str, Any]):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(record, default=_to_json) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TableSink(Sink):
+    """Prints each record as a row of a table, below a header with the names of the first record's fields.
+
+    Parameters
+    ----------
+    stream : IO, optional
+        The stream to print to. Default is stdout.
+
+    """
+
+    def __init__(self, stream: IO = None):
+        self.stream = stream
+        self._columns = None
+
+    def write(self, record: Mapping[str, Any]):
+        stream = sys.stdout if self.stream is None else self.stream
+        if self._columns is None:
+            self._columns = list(record.keys())
+            print("\t".join(self._columns), file=stream)
+        print("\t".join(self._format(record.get(col)) for col in self._columns), file=stream)
+
+    @staticmethod
+    def _format(value) -> str:
+        if value is None:
+            return "-"
+        if isinstance(value, (float, np.floating)):
+            return "{v:.4g}".format(v=value)
+        return str(value)
+
+
+class _Phase:
+    """Adds the wall and CPU time spent in a `with` block to the record."""
+
+    __slots__ = ["record", "name", "wall", "cpu"]
+
+    def __init__(self, record: dict, name: str):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        wall_key = self.name + "_wall"
+        cpu_key = self.name + "_cpu"
+        self.record[wall_key] = self.record.get(wall_key, 0.0) + time.perf_counter() - self.wall
+        self.record[cpu_key] = self.record.get(cpu_key, 0.0) + time.process_time() - self.cpu
+
+
+class Instrumentation:
+    """Records the time spent in each phase of a generation, and other values, for its sinks.
+
+    Parameters
+    ----------
+    sinks : Sequence[Sink]
+        The sinks the record of each generation is written to.
+
+    Attributes
+    ----------
+    sinks : List[Sink]
+        The sinks the record of each generation is written to.
+    enabled : bool
+        False if nothing is recorded, so statistics need not be computed.
+
+    """
+
+    enabled = True
+
+    def __init__(self, sinks: Sequence[Sink]):
+        self.sinks = list(sinks)
+        self._record = {}
+
+    def phase(self, name: str):
+        """Context manager which adds the wall and CPU time of its block to `<name>_wall` and `<name>_cpu`."""
+        return _Phase(self._record, name)
+
+    def count(self, name: str, n: int = 1):
+        """Add `n` to the counter with the given name."""
+        self._record[name] = self._record.get(name, 0) + n
+
+    def record(self, name: str, value: Any):
+        """Set the value with the given name."""
+        self._record[name] = value
+
+    def end_generation(self, generation: int):
+        """Write the record of the generation to the sinks and start a new record."""
+        record = {"generation": generation}
+        record.update(self._record)
+        self._record = {}
+        for sink in self.sinks:
+            sink.write(record)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class _NullPhase:
+
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _NullInstrumentation(Instrumentation):
+    """Instrumentation which records nothing."""
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__([])
+
+    def phase(self, name: str):
+        return _NULL_PHASE
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def record(self, name: str, value: Any):
+        pass
+
+    def end_generation(self, generation: int):
+        pass
+
+
+NO_INSTRUMENTATION = _NullInstrumentation()
@@ -0,0 +1,111 @@
+"""The :mod:`parallel` module defines how Individuals are evaluated by a pool of processes.
+
+Only genomes are sent to the worker processes and only error vectors are sent
+back. Each worker receives the error function, output type and the units of the
+soup once, when the pool is started, and compiles the programs itself.
+
+"""
+from functools import partial
+from multiprocessing import Pool
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from push4.gp.individual import Genome, Individual
+from push4.gp.soup import Unit
+from push4.lang.dag import Dag
+
+# State of a worker process, set once by `_init_worker`.
+_worker_error_function = None
+_worker_output_type = None
+_worker_units = None
+
+
+def _init_worker(error_function: Callable[[Dag], np.array], output_type: type, units: Sequence[Unit] = None):
+    global _worker_error_function, _worker_output_type, _worker_units
+    _worker_error_function = error_function
+    _worker_output_type = output_type
+    _worker_units = units
+
+
+def _eval_genome(genome: Genome, cases: np.ndarray = None, threshold: float = None) -> np.ndarray:
+    program = Individual(genome, _worker_output_type, units=_worker_units).program
+    kwargs = {}
+    if cases is not None:
+        kwargs["cases"] = cases
+    if threshold is not None:
+        kwargs["threshold"] = threshold
+    return _worker_error_function(program, **kwargs)
+
+
+class ParallelContext:
+    """A pool of worker processes which evaluate genomes.
+
+    Parameters
+    ----------
+    n_proc : int, optional
+        Number of worker processes. Default is the number of CPUs.
+    chunksize : int, optional
+        Number of genomes sent to a worker at a time. Default is 10.
+
+    Attributes
+    ----------
+    n_proc : int
+        Number of worker processes. If None, the number of CPUs is used.
+    chunksize : int
+        Number of genomes sent to a worker at a time.
+    pool : multiprocessing.Pool
+        The pool of worker processes. None until the context is started.
+
+    """
+
+    def __init__(self, n_proc: int = None, chunksize: int = 10):
+        self.n_proc = n_proc
+        self.chunksize = chunksize
+        self.pool = None
+
+    def start(self, error_function: Callable[[Dag], np.array], output_type: type, units: Sequence[Unit] = None):
+        """Start the worker processes.
+
+        Parameters
+        ----------
+        error_function
+            The function that computes the error vector of a program. It is
+            sent to each worker once.
+        output_type
+            The output type of the programs compiled from genomes.
+        units
+            The units of the Soup that CompactGenomes are decoded with. It is
+            sent to each worker once, so only the codes of genomes are sent
+            for each evaluation.
+
+        """
+        self.close()
+        self.pool = Pool(self.n_proc, initializer=_init_worker, initargs=(error_function, output_type, units))
+        return self
+
+    def close(self):
+        """Stop the worker processes."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def evaluate(self,
+                 genomes: Sequence[Genome],
+                 cases: np.ndarray = None,
+                 threshold: float = None) -> List[np.ndarray]:
+        """Return the error vector of each genome's program, in the order of the genomes.
+
+        If `cases` is given, the error function is called with the indices of the
+        training cases to evaluate programs on. If `threshold` is given, it is passed
+        to the error function.
+        """
+        assert self.pool is not None, "ParallelContext must be started before evaluating."
+        return self.pool.map(partial(_eval_genome, cases=cases, threshold=threshold), genomes, self.chunksize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
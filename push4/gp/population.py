@@ -1,13 +1,14 @@
+from collections import OrderedDict
+from functools import partial
 from collections.abc import Sequence
-from bisect import insort_left
-from typing import Callable
+from typing import Callable, Hashable, Optional, List, Tuple
 
 import numpy as np
 import pickle
-from multiprocessing import Pool
-from functools import partial
 
 from push4.gp.individual import Individual
+from push4.gp.parallel import ParallelContext
+from push4.gp.racing import n_aborted
 from push4.lang.dag import Dag
 
 
@@ -16,33 +17,171 @@ def _eval_indiv(indiv: Individual, error_fn: Callable[[Dag], np.array]):
     return indiv
 
 
+class FitnessCache:
+    """A bounded cache of error vectors, keyed by the canonical code of compiled programs.
+
+    Many children compile to the same program as their parent or a sibling. The
+    cache lets them skip the error function. When full, the least recently used
+    entry is evicted.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        The maximum number of error vectors to keep. Default is 10000.
+
+    Attributes
+    ----------
+    max_size : int
+        The maximum number of error vectors to keep.
+    hits : int
+        Number of lookups that found an error vector.
+    misses : int
+        Number of lookups that did not find an error vector.
+
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(program: Optional[Dag], cases: np.ndarray = None) -> Hashable:
+        """Return the cache key of a program evaluated on the given cases, or on all cases if None.
+
+        All programs that failed to compile share a key.
+        """
+        code = None if program is None else program.canonical_code()
+        if cases is None:
+            return code
+        return code, np.asarray(cases).tobytes()
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Return the cached error vector for the key, or None."""
+        error_vector = self._entries.get(key)
+        if error_vector is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return error_vector
+
+    def put(self, key: Hashable, error_vector: np.ndarray):
+        """Cache the error vector of the program with the given key."""
+        self._entries[key] = error_vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        """Proportion of all lookups that found an error vector."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _cache_put(cache: FitnessCache, key: Hashable, error_vector: np.ndarray):
+    # Aborted evaluations depend on the threshold they were given, so they are not cached.
+    if n_aborted(error_vector) == 0:
+        cache.put(key, error_vector)
+
+
 class Population(Sequence):
-    """A sequence of Individuals kept in sorted order, with respect to their total errors."""
+    """A sequence of Individuals kept in sorted order, with respect to their total errors.
+
+    The error vectors and total errors of evaluated Individuals are stored in
+    preallocated arrays, with one row per Individual. Adding an evaluated
+    Individual appends a row, and the rows are sorted by total error with a single
+    argsort the next time the order is needed.
+    """
 
-    __slots__ = ["unevaluated", "evaluated"]
+    __slots__ = ["unevaluated", "n_aborted_errors", "_evaluated", "_errors", "_total_errors", "_n_evaluated",
+                 "_is_sorted", "_unique_error_vectors"]
 
     def __init__(self, individuals: list = None):
         self.unevaluated = []
-        self.evaluated = []
+        # Number of errors which error functions did not compute, because the evaluation was aborted.
+        self.n_aborted_errors = 0
+        self._evaluated = []
+        self._errors = None
+        self._total_errors = None
+        self._n_evaluated = 0
+        self._is_sorted = True
+        self._unique_error_vectors = None
 
         if individuals is not None:
             for el in individuals:
                 self.add(el)
 
+    @property
+    def evaluated(self) -> List[Individual]:
+        """The evaluated Individuals, sorted by total error."""
+        self._sort()
+        return self._evaluated
+
     def __len__(self):
-        return len(self.evaluated) + len(self.unevaluated)
+        return self._n_evaluated + len(self.unevaluated)
 
     def __getitem__(self, key: int) -> Individual:
-        if key < len(self.evaluated):
+        if key < self._n_evaluated:
             return self.evaluated[key]
-        return self.unevaluated[key - len(self.evaluated)]
+        return self.unevaluated[key - self._n_evaluated]
+
+    def __iter__(self):
+        yield from self.evaluated
+        yield from self.unevaluated
+
+    def _append_evaluated(self, individual: Individual):
+        error_vector = np.asarray(individual.error_vector)
+        if self._errors is None:
+            capacity = max(16, len(self.unevaluated) + 1)
+            self._errors = np.empty((capacity, len(error_vector)), dtype=error_vector.dtype)
+            self._total_errors = np.empty(capacity, dtype=np.float64)
+        elif error_vector.shape != self._errors.shape[1:]:
+            raise ValueError("All error vectors in a Population must have the same length.")
+        if self._n_evaluated == len(self._errors):
+            self._errors = np.resize(self._errors, (2 * len(self._errors), self._errors.shape[1]))
+            self._total_errors = np.resize(self._total_errors, 2 * len(self._total_errors))
+        if not np.can_cast(error_vector.dtype, self._errors.dtype):
+            self._errors = self._errors.astype(np.result_type(self._errors, error_vector))
+        self._errors[self._n_evaluated] = error_vector
+        self._total_errors[self._n_evaluated] = individual.total_error
+        self._evaluated.append(individual)
+        self._n_evaluated += 1
+        self._is_sorted = False
+        self._unique_error_vectors = None
+
+    def _sort(self):
+        if self._is_sorted:
+            return
+        n = self._n_evaluated
+        order = np.argsort(self._total_errors[:n], kind="stable")
+        self._errors[:n] = self._errors[order]
+        self._total_errors[:n] = self._total_errors[order]
+        self._evaluated = [self._evaluated[ndx] for ndx in order]
+        self._is_sorted = True
+
+    def __copy__(self):
+        cp = Population()
+        cp.unevaluated = list(self.unevaluated)
+        cp.n_aborted_errors = self.n_aborted_errors
+        cp._evaluated = list(self._evaluated)
+        cp._errors = None if self._errors is None else self._errors.copy()
+        cp._total_errors = None if self._total_errors is None else self._total_errors.copy()
+        cp._n_evaluated = self._n_evaluated
+        cp._is_sorted = self._is_sorted
+        cp._unique_error_vectors = self._unique_error_vectors
+        return cp
 
     def add(self, individual: Individual):
         """Add an Individual to the population."""
         if individual.total_error is None:
             self.unevaluated.append(individual)
         else:
-            insort_left(self.evaluated, individual)
+            self._append_evaluated(individual)
         return self
 
     def best(self):
@@ -53,27 +192,126 @@ class Population(Sequence):
         """Return the best n individuals in the population."""
         return self.evaluated[:n]
 
-    def p_evaluate(self, error_fn, pool: Pool):
-        """Evaluate all unevaluated individuals in the population in parallel."""
-        func = partial(_eval_indiv, error_fn=error_fn)
-        for individual in pool.imap_unordered(func, self.unevaluated):
-            insort_left(self.evaluated, individual)
-        self.unevaluated = []
+    def p_evaluate(self,
+                   context: ParallelContext,
+                   cache: FitnessCache = None,
+                   cases: np.ndarray = None,
+                   threshold: float = None):
+        """Evaluate all unevaluated individuals in the population in parallel.
 
-    def evaluate(self, error_fn: Callable[[Dag], np.array]):
-        """Evaluate all unevaluated individuals in the population."""
+        Individuals with the same genome as their parent reuse its errors. If a
+        cache is given, programs are compiled in this process to look up their
+        error vectors, and Individuals which compile to the same program as
+        their parent reuse its errors too. Only genomes of programs not found
+        in the cache, one per distinct program, are sent to the workers. If
+        `cases` is given, the error function is called with the indices of the
+        training cases to evaluate programs on. If `threshold` is given, it is
+        passed to the error function, which may abort evaluations of programs
+        whose total error exceeds it.
+        """
+        # Programs are compiled in this process only to look them up in the cache.
+        unevaluated = [i for i in self.unevaluated if not i.reuse_parent_errors(cases, compile=cache is not None)]
+        if cache is None:
+            to_send = unevaluated
+        else:
+            to_send = []
+            pending = OrderedDict()
+            for individual in unevaluated:
+                key = cache.key(individual.program, cases)
+                if key in pending:
+                    # Same program as an individual waiting for evaluation.
+                    cache.hits += 1
+                    pending[key].append(individual)
+                    continue
+                individual.error_vector = cache.get(key)
+                if individual.error_vector is None:
+                    pending[key] = [individual]
+                    to_send.append(individual)
+        error_vectors = context.evaluate([i.genome for i in to_send], cases, threshold)
+        for error_vector in error_vectors:
+            self.n_aborted_errors += n_aborted(error_vector)
+        if cache is None:
+            for individual, error_vector in zip(to_send, error_vectors):
+                individual.error_vector = error_vector
+        else:
+            for (key, individuals), error_vector in zip(pending.items(), error_vectors):
+                _cache_put(cache, key, error_vector)
+                for individual in individuals:
+                    individual.error_vector = error_vector
+        self._add_evaluated(cases)
+
+    def evaluate(self,
+                 error_fn: Callable[[Dag], np.array],
+                 cache: FitnessCache = None,
+                 cases: np.ndarray = None,
+                 threshold: float = None):
+        """Evaluate all unevaluated individuals in the population.
+
+        Individuals which are known to have the same program as their parent
+        reuse its errors. If a cache is given, it is used to skip the error
+        function for programs which have been evaluated before. If `cases` is
+        given, the error function is called with the indices of the training
+        cases to evaluate programs on. If `threshold` is given, it is passed to
+        the error function, which may abort evaluations of programs whose total
+        error exceeds it.
+        """
+        if cases is not None:
+            error_fn = partial(error_fn, cases=cases)
+        if threshold is not None:
+            error_fn = partial(error_fn, threshold=threshold)
         for individual in self.unevaluated:
-            individual = _eval_indiv(individual, error_fn)
-            insort_left(self.evaluated, individual)
+            if individual.reuse_parent_errors(cases):
+                continue
+            if cache is None:
+                individual = _eval_indiv(individual, error_fn)
+                self.n_aborted_errors += n_aborted(individual.error_vector)
+            else:
+                key = cache.key(individual.program, cases)
+                individual.error_vector = cache.get(key)
+                if individual.error_vector is None:
+                    individual = _eval_indiv(individual, error_fn)
+                    self.n_aborted_errors += n_aborted(individual.error_vector)
+                    _cache_put(cache, key, individual.error_vector)
+        self._add_evaluated(cases)
+
+    def _add_evaluated(self, cases: np.ndarray = None):
+        """Move the unevaluated Individuals, which have all been evaluated on `cases`, to the evaluated Individuals."""
+        unevaluated = self.unevaluated
         self.unevaluated = []
+        for individual in unevaluated:
+            individual.error_cases = cases
+            self._append_evaluated(individual)
 
     def all_error_vectors(self):
-        """2D array containing all Individuals' error vectors."""
-        return np.vstack([i.error_vector for i in self.evaluated])
+        """2D array containing all Individuals' error vectors, in sorted order. Not a copy."""
+        self._sort()
+        return self._errors[:self._n_evaluated]
+
+    def unique_error_vectors(self) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Distinct error vectors of the evaluated Individuals.
+
+        Computed once and reused until the evaluated Individuals change.
+
+        Returns
+        -------
+        errors : np.ndarray
+            2D array with one row per distinct error vector.
+        groups : List[np.ndarray]
+            For each row of `errors`, the indices of the Individuals with that error vector.
+
+        """
+        if self._unique_error_vectors is None:
+            errors, inverse, counts = np.unique(
+                self.all_error_vectors(), axis=0, return_inverse=True, return_counts=True
+            )
+            groups = np.split(np.argsort(inverse, kind="stable"), np.cumsum(counts)[:-1])
+            self._unique_error_vectors = (errors, groups)
+        return self._unique_error_vectors
 
     def all_total_errors(self):
-        """1D array containing all Individuals' total errors."""
-        return np.array([i.total_error for i in self.evaluated])
+        """1D array containing all Individuals' total errors, in sorted order. Not a copy."""
+        self._sort()
+        return self._total_errors[:self._n_evaluated]
 
     def median_error(self):
         """Median total error in the population."""
@@ -81,7 +319,7 @@ class Population(Sequence):
 
     def error_diversity(self):
         """Proportion of unique error vectors."""
-        return len(np.unique(self.all_error_vectors(), axis=0)) / float(len(self))
+        return len(self.unique_error_vectors()[0]) / float(len(self))
 
     def genome_diversity(self):
         """Proportion of unique genomes."""
@@ -0,0 +1,62 @@
+"""The :mod:`racing` module lets error functions stop evaluating programs which cannot be selected.
+
+An error function opts in by taking a `threshold` keyword argument. The evolver
+passes the total error above which Individuals are not expected to be selected,
+or None. Once the errors of a program add up to more than the threshold, the
+remaining errors need not be computed and are set to `ABORTED`.
+
+"""
+from inspect import signature
+from typing import Callable, Iterable, Optional, Sequence, Union
+
+import numpy as np
+
+# The error of cases which were not evaluated because the evaluation was aborted. It is finite, so that
+# statistics of errors, such as the MAD used by epsilon lexicase, stay finite, and distinct from genuine
+# infinite errors. It is small enough that the total of many aborted errors does not overflow.
+ABORTED = 1e300
+
+
+def accepts_threshold(error_function: Callable) -> bool:
+    """True if the error function takes a `threshold` keyword argument."""
+    try:
+        return "threshold" in signature(error_function).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def n_aborted(error_vector: np.ndarray) -> int:
+    """The number of errors which were not computed."""
+    return int(np.count_nonzero(np.asarray(error_vector) == ABORTED))
+
+
+def race(case_errors: Iterable[Union[float, Sequence[float]]], n_cases: int, threshold: Optional[float]) -> np.ndarray:
+    """Collect the errors of a program case by case, until their total exceeds the threshold.
+
+    Parameters
+    ----------
+    case_errors
+        The error, or the sequence of errors, of each case. Errors are computed
+        lazily, for example by a generator, so cases after the evaluation is
+        aborted are never evaluated.
+    n_cases
+        The number of cases.
+    threshold
+        The total error above which the evaluation is aborted. If None, all
+        cases are evaluated.
+
+    Returns
+    -------
+    The errors on all cases, with the errors of cases which were not evaluated set to `ABORTED`.
+
+    """
+    rows = []
+    total = 0.0
+    for error in case_errors:
+        rows.append(error)
+        total += error if np.isscalar(error) else sum(error)
+        if threshold is not None and total > threshold and len(rows) < n_cases:
+            errors = np.array(rows, dtype=float)
+            aborted = np.full((n_cases - len(rows),) + errors.shape[1:], ABORTED)
+            return np.concatenate([errors, aborted]).ravel()
+    return np.array(rows, dtype=float).ravel()
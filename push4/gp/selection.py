@@ -1,11 +1,11 @@
 """The :mod:`selection` module defines classes to select Individuals from Populations."""
 from abc import ABC, abstractmethod
 from copy import copy
-from typing import Sequence, Union
+from typing import Iterable, Optional, Sequence, Union
 from operator import attrgetter
 
 import numpy as np
-from numpy.random import random, choice, shuffle
+from numpy.random import random, choice, permutation, shuffle
 
 from push4.gp.individual import Individual
 from push4.gp.population import Population
@@ -15,6 +15,22 @@ from push4.utils import median_absolute_deviation
 class Selector(ABC):
     """Base class for all selection algorithms."""
 
+    def sample_cases(self, n_cases: int) -> Optional[np.ndarray]:
+        """Return the indices of the training cases to evaluate Individuals on this generation.
+
+        Parameters
+        ----------
+        n_cases : int
+            The number of training cases.
+
+        Returns
+        -------
+        Optional[np.ndarray]
+            Sorted indices of training cases, or None to evaluate on all cases.
+
+        """
+        return None
+
     @abstractmethod
     def select_one(self, population: Population) -> Individual:
         """Return single individual from population.
@@ -53,6 +69,34 @@ class Selector(ABC):
             selected.append(self.select_one(population))
         return selected
 
+    def select_batch(self, population: Population, n_total: int, group_size: int = 1) -> np.ndarray:
+        """Return the indices of `n_total` Individuals selected from the population.
+
+        Selects all parents of a generation in one call, so that work which only
+        depends on the population is done once.
+
+        Parameters
+        ----------
+        population : Population
+            A Population of Individuals.
+        n_total : int
+            The number of Individuals to select.
+        group_size : int, optional
+            The indices are returned in consecutive groups of `group_size`. Each
+            group is selected like a call to `select` with `n=group_size`. Default is 1.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the selected Individuals in the population.
+
+        """
+        ndx_of = {id(individual): ndx for ndx, individual in enumerate(population)}
+        selected = []
+        while len(selected) < n_total:
+            selected += [ndx_of[id(i)] for i in self.select(population, n=group_size)]
+        return np.array(selected[:n_total], dtype=int)
+
 
 class FitnessProportionate(Selector):
     """Fitness proportionate selection, also known as roulette wheel selection.
@@ -91,12 +135,31 @@ class FitnessProportionate(Selector):
         Sequence[Individual]
             The selected Individuals.
 
+        """
+        return [population[ndx] for ndx in self.select_batch(population, n)]
+
+    def select_batch(self, population: Population, n_total: int, group_size: int = 1) -> np.ndarray:
+        """Return the indices of `n_total` Individuals selected from the population.
+
+        Parameters
+        ----------
+        population : Population
+            A Population of Individuals.
+        n_total : int
+            The number of Individuals to select.
+        group_size : int, optional
+            Ignored, because all selections are independent. Default is 1.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the selected Individuals in the population.
+
         """
         population_total_errors = np.array([i.total_error for i in population])
         sum_of_total_errors = np.sum(population_total_errors)
         probabilities = 1.0 - (population_total_errors / sum_of_total_errors)
-        selected_ndxs = np.searchsorted(np.cumsum(probabilities), random(n))
-        return [population[ndx] for ndx in selected_ndxs]
+        return np.searchsorted(np.cumsum(probabilities), random(n_total))
 
 
 class Tournament(Selector):
@@ -138,6 +201,37 @@ class Tournament(Selector):
         tournament = choice(population, self.tournament_size, replace=False)
         return min(tournament, key=attrgetter('total_error'))
 
+    def select_batch(self, population: Population, n_total: int, group_size: int = 1) -> np.ndarray:
+        """Return the indices of `n_total` Individuals selected from the population.
+
+        Parameters
+        ----------
+        population : Population
+            A Population of Individuals.
+        n_total : int
+            The number of Individuals to select.
+        group_size : int, optional
+            Ignored, because all tournaments are independent. Default is 1.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the selected Individuals in the population.
+
+        """
+        if self.tournament_size > len(population):
+            raise ValueError("Cannot take a larger sample than population when 'replace=False'")
+        # Each row of random keys orders the population randomly. The first `tournament_size`
+        # Individuals of each order form a tournament, in random order.
+        keys = random((n_total, len(population)))
+        tournaments = np.argpartition(keys, self.tournament_size - 1, axis=1)[:, :self.tournament_size]
+        order = np.argsort(np.take_along_axis(keys, tournaments, axis=1), axis=1)
+        tournaments = np.take_along_axis(tournaments, order, axis=1)
+        # Like `min`, argmin returns the first of the tied best Individuals in each tournament.
+        total_errors = np.array([i.total_error for i in population])
+        winners = np.argmin(total_errors[tournaments], axis=1)
+        return tournaments[np.arange(n_total), winners]
+
 
 class CaseStream:
 
@@ -183,34 +277,54 @@ class Lexicase(Selector):
 
     def __init__(self, epsilon: Union[bool, float, np.ndarray] = False):
         self.epsilon = epsilon
+        self._mad_errors = None
+        self._mad_epsilon = None
 
     @staticmethod
     def _epsilon_from_mad(error_matrix: np.ndarray):
-        return np.apply_along_axis(median_absolute_deviation, 0, error_matrix)
-
-    def _select_with_stream(self, population: Population, cases: CaseStream) -> Individual:
-        candidates = one_individual_per_error_vector(population)
-
+        # The MAD of a case is nan if at least half of the errors on it are infinite. Only
+        # the best Individuals on such cases are kept, instead of none.
+        with np.errstate(invalid="ignore"):
+            ep = np.apply_along_axis(median_absolute_deviation, 0, error_matrix)
+        ep[np.isnan(ep)] = 0.0
+        return ep
+
+    def _epsilon(self, population: Population, errors: np.ndarray):
         ep = self.epsilon
         if isinstance(ep, bool) and ep:
-            ep = self._epsilon_from_mad(population.all_error_vectors())
+            # The distinct error vectors of a population are only recomputed when it changes.
+            if self._mad_errors is not errors:
+                self._mad_epsilon = self._epsilon_from_mad(population.all_error_vectors())
+                self._mad_errors = errors
+            ep = self._mad_epsilon
+        elif isinstance(ep, bool):
+            ep = 0
+        return ep
 
+    @staticmethod
+    def _select_row(errors: np.ndarray, ep, cases: Iterable[int]) -> int:
+        candidates = np.arange(len(errors))
         for case in cases:
             if len(candidates) <= 1:
                 break
 
-            errors_this_case = [i.error_vector[case] for i in candidates]
-            best_val_for_case = min(errors_this_case)
-
-            max_error = best_val_for_case
+            errors_this_case = errors[candidates, case]
+            max_error = errors_this_case.min()
             if isinstance(ep, np.ndarray):
                 max_error += ep[case]
-            elif isinstance(ep, (float, int, np.int64, np.float64)):
+            else:
                 max_error += ep
 
-            candidates = [i for i in candidates if i.error_vector[case] <= max_error]
+            candidates = candidates[errors_this_case <= max_error]
         return choice(candidates)
 
+    def _select_with_stream(self, population: Population, cases: CaseStream) -> Individual:
+        # Filters the distinct error vectors, which is equivalent to filtering one
+        # random Individual per error vector.
+        errors, groups = population.unique_error_vectors()
+        ep = self._epsilon(population, errors)
+        return population[choice(groups[self._select_row(errors, ep, cases)])]
+
     def select_one(self, population: Population) -> Individual:
         """Return single individual from population.
 
@@ -228,6 +342,75 @@ class Lexicase(Selector):
         cases = CaseStream(len(population[0].error_vector))
         return self._select_with_stream(population, cases)
 
+    def select_batch(self, population: Population, n_total: int, group_size: int = 1) -> np.ndarray:
+        """Return the indices of `n_total` Individuals selected from the population.
+
+        Parameters
+        ----------
+        population : Population
+            A Population of Individuals.
+        n_total : int
+            The number of Individuals to select.
+        group_size : int, optional
+            Ignored, because all selections are independent. Default is 1.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the selected Individuals in the population.
+
+        """
+        errors, groups = population.unique_error_vectors()
+        ep = self._epsilon(population, errors)
+        n_cases = errors.shape[1]
+        rows = [self._select_row(errors, ep, permutation(n_cases)) for _ in range(n_total)]
+        return np.array([choice(groups[row]) for row in rows], dtype=int)
+
+
+class DownsampledLexicase(Lexicase):
+    """Lexicase Selection on a random subset of the training cases.
+
+    Each generation, Individuals are only evaluated on a new random sample of the
+    training cases, and lexicase selection only considers those cases. Evaluation
+    is cheaper by a factor of about `1 / downsample_rate`.
+
+    See: https://arxiv.org/abs/1905.09372
+
+    Parameters
+    ----------
+    downsample_rate : float, optional
+        Proportion of the training cases sampled each generation. Default is 0.1.
+    epsilon : Union[bool, float, np.ndarray], optional
+        The epsilon of epsilon lexicase. Default is False.
+
+    Attributes
+    ----------
+    downsample_rate : float
+        Proportion of the training cases sampled each generation.
+
+    """
+
+    def __init__(self, downsample_rate: float = 0.1, epsilon: Union[bool, float, np.ndarray] = False):
+        super().__init__(epsilon)
+        self.downsample_rate = downsample_rate
+
+    def sample_cases(self, n_cases: int) -> Optional[np.ndarray]:
+        """Return the indices of the training cases to evaluate Individuals on this generation.
+
+        Parameters
+        ----------
+        n_cases : int
+            The number of training cases.
+
+        Returns
+        -------
+        np.ndarray
+            Sorted indices of a random sample of at least one training case.
+
+        """
+        n_sampled = max(1, int(round(self.downsample_rate * n_cases)))
+        return np.sort(choice(n_cases, n_sampled, replace=False))
+
 
 class Elite(Selector):
     """Returns the best N individuals by total error."""
@@ -265,3 +448,24 @@ class Elite(Selector):
 
         """
         return population.best_n(n)
+
+    def select_batch(self, population: Population, n_total: int, group_size: int = 1) -> np.ndarray:
+        """Return the indices of `n_total` Individuals selected from the population.
+
+        Parameters
+        ----------
+        population : Population
+            A Population of Individuals.
+        n_total : int
+            The number of Individuals to select.
+        group_size : int, optional
+            Each group holds the indices of the best `group_size` Individuals. Default is 1.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the selected Individuals in the population.
+
+        """
+        group = np.arange(min(group_size, len(population.evaluated)))
+        return np.resize(group, n_total)
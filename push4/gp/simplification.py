@@ -4,11 +4,13 @@ from typing import Callable, Sequence, Tuple
 import numpy as np
 from pyrsistent import pvector
 
+from push4.gp.genome import CompactGenome
 from push4.gp.spawn import genome_to_push_code
 from push4.lang.dag import Dag
 from push4.lang.expr import Expression
 from push4.gp.individual import Genome, Individual
 from push4.lang.push import Push
+from push4.lang.rewrite import simplify_dag
 
 
 class GenomeSimplifier:
@@ -53,7 +55,7 @@ class GenomeSimplifier:
 
     def _errors_of_genome(self, genome: Genome) -> np.ndarray:
         push_code = genome_to_push_code(genome)
-        dag = Push().compile(push_code, self.output_type)
+        dag = simplify_dag(Push().compile(push_code, self.output_type))
         return self.error_fn(dag)
 
     def _step(self, genome: Genome, errors_to_beat: np.ndarray) -> Tuple[Genome, np.ndarray]:
@@ -80,6 +82,8 @@ class GenomeSimplifier:
             A Genome with random contents of a given size.
         """
         gn = individual.genome
+        if isinstance(gn, CompactGenome):
+            gn = gn.decode(individual.units)
         errs = individual.error_vector
         print("Simplifying genome of length {ln}.".format(ln=len(gn)))
         for step in range(steps):
@@ -90,10 +94,3 @@ class GenomeSimplifier:
         simplified_individual = Individual(gn, individual.output_type)
         simplified_individual.error_vector = errs
         return simplified_individual
-
-
-# @TODO: DAG simplification
-#   1. If all leaves are constant, replace subtree with constant.
-#   2. Replace `t + 0` with t.
-#   3. Replace `t * 0` with 0.
-
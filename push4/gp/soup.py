@@ -1,10 +1,12 @@
 import inspect
 import random
-from copy import deepcopy
 from enum import Enum
 from inspect import getmembers, isfunction, signature, _empty
 from typing import Any, Callable, Mapping, List, Sequence, Tuple, Union, get_type_hints
 
+import numpy as np
+
+from push4.collections import DiscreteProbDistrib
 from push4.library import functions, classes
 from push4.lang.expr import Input, Constant, Function, Constructor, Expression, Method
 from push4.lang.hof import FilterExpr, MapExpr, LocalInput
@@ -35,34 +37,40 @@ Unit = Union[Expression, GeneToken, ErcGenerator]
 class Soup:
 
     def __init__(self):
-        self.units: List[Unit] = [
-            GeneToken.OPEN,
-            GeneToken.CLOSE
-        ]
+        self.units: List[Unit] = []
+        self.weights: List[float] = []
+        self._distrib = None
+        self.register_unit(GeneToken.OPEN)
+        self.register_unit(GeneToken.CLOSE)
+
+    def register_unit(self, unit: Unit, weight: float = 1.0):
+        """Add a unit which is sampled with a probability proportional to its weight."""
+        self.units.append(unit)
+        self.weights.append(weight)
+        self._distrib = None
+        return self
 
     def register_constant(self, value: Any, type_override: type = None):
-        self.units.append(Constant(value, type_override))
-        return self
+        return self.register_unit(Constant(value, type_override))
 
     def register_constants(self, values: Sequence[Any], type_override: type = None):
-        self.units = self.units + [Constant(v, type_override) for v in values]
+        for v in values:
+            self.register_unit(Constant(v, type_override))
         return self
 
     def register_input(self, name: str, typ: type):
-        self.units.append(Input(name, typ))
-        return self
+        return self.register_unit(Input(name, typ))
 
     def register_function(self, fn: Callable, reifier: TypeReifier = None):
-        self.units.append(Function(fn, reifier))
-        return self
+        return self.register_unit(Function(fn, reifier))
 
     def register_functions(self, fns: Sequence[Tuple[Callable, TypeReifier]]):
-        self.units = self.units + [Function(f, r) for f, r in fns]
+        for f, r in fns:
+            self.register_unit(Function(f, r))
         return self
 
     def register_constructor(self, cls: type):
-        self.units.append(Constructor(cls))
-        return self
+        return self.register_unit(Constructor(cls))
 
     def register_methods(self, cls: type, reifiers: Mapping[str, TypeReifier] = None):
         if reifiers is None:
@@ -70,7 +78,7 @@ class Soup:
         for nm, fn in getmembers(cls, predicate=isfunction):
             ret = signature(fn).return_annotation
             if not (ret == _empty or nm.startswith("_")):
-                self.units.append(Method(fn, reifiers.get(nm)))
+                self.register_unit(Method(fn, reifiers.get(nm)))
         return self
 
     def register_class(self, cls: type):
@@ -79,26 +87,42 @@ class Soup:
         return self
 
     def register_hofs(self):
-        self.units.append(MapExpr())
-        self.units.append(FilterExpr())
-        self.units += [LocalInput(i) for i in range(3)]
+        self.register_unit(MapExpr())
+        self.register_unit(FilterExpr())
+        for i in range(3):
+            self.register_unit(LocalInput(i))
         return self
 
     # @TODO: register_stack_instruction
     # @TODO: register_code_instruction
 
     def register_erc_generator(self, generator_fn: Callable):
-        self.units.append(ErcGenerator(generator_fn))
-        return self
+        return self.register_unit(ErcGenerator(generator_fn))
+
+    def _unit_distrib(self) -> DiscreteProbDistrib:
+        if self._distrib is None:
+            self._distrib = DiscreteProbDistrib()
+            for unit, weight in zip(self.units, self.weights):
+                self._distrib.add(unit, weight)
+        return self._distrib
+
+    @staticmethod
+    def _instantiate(unit: Unit) -> Expression:
+        # Units are not copied. Genes are shared by every genome that contains them and
+        # Push copies a gene before building a node from it.
+        if isinstance(unit, ErcGenerator):
+            return unit.create_constant()
+        return unit
 
     def random_unit(self) -> Expression:
-        unit = random.choice(self.units)
-        if isinstance(unit, ErcGenerator):
-            unit = unit.create_constant()
-        return deepcopy(unit)
+        return self._instantiate(self._unit_distrib().sample())
 
     def random_units(self, k: int) -> List[Expression]:
-        return [self.random_unit() for _ in range(k)]
+        return [self._instantiate(self.units[ndx]) for ndx in self._unit_distrib().sample_n(k)]
+
+    def random_unit_ndxs(self, k: int) -> np.ndarray:
+        """The indices in `units` of `k` randomly sampled units. ERC generators are not instantiated."""
+        return self._unit_distrib().sample_n(k)
 
 
 def rand_float() -> float:
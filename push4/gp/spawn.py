@@ -1,54 +1,76 @@
 import random
-from copy import deepcopy
-from typing import Sequence, Union
+from typing import List, Sequence, Union
 
+import numpy as np
 from pyrsistent import pvector, PVector
 
+from push4.gp.genome import CompactGenome, code_dtype, erc_code
 from push4.gp.soup import Soup, Unit, GeneToken, ErcGenerator
 from push4.lang.expr import Expression
 
 
 def genome_to_push_code(genome: Sequence[Unit]) -> Sequence[Union[Expression, PVector]]:
-    buffer = pvector(genome)
-    push_code = []
-    while True:
-        # If done with plush but unclosed opens, recur with one more close.
-        if len(buffer) == 0 and GeneToken.OPEN in push_code:
-            buffer = buffer.append(GeneToken.CLOSE)
-        # If done with plush and all opens closed, return push.
-        elif len(buffer) == 0:
-            return pvector(push_code)
+    # Each OPEN starts a new block on top of the stack. Each CLOSE ends the top block,
+    # which becomes a single element of the block beneath it. CLOSEs without a matching
+    # OPEN are ignored and blocks left open at the end of the genome are closed.
+    blocks = [[]]
+    for gene in genome:
+        if gene is GeneToken.OPEN:
+            blocks.append([])
+        elif gene is GeneToken.CLOSE:
+            if len(blocks) > 1:
+                block = blocks.pop()
+                blocks[-1].append(pvector(block))
         else:
-            gene = buffer[0]
-            # If next instruction is a close, and there is an open.
-            if gene == GeneToken.CLOSE and GeneToken.OPEN in push_code:
-                ndx, opener = [(ndx, el) for ndx, el in enumerate(push_code) if el == GeneToken.OPEN][-1]
-                post_open = push_code[ndx + 1:]
-                pre_open = push_code[:ndx]
-                push_code = pre_open + [pvector(post_open)]
-            # If next instruction is a close, and there is no open.
-            elif not gene == GeneToken.CLOSE:
-                push_code.append(gene)
-            buffer = buffer.delete(0)
+            blocks[-1].append(gene)
+    while len(blocks) > 1:
+        block = blocks.pop()
+        blocks[-1].append(pvector(block))
+    return pvector(blocks[0])
 
 
 class Spawner:
+    """Spawns random genes and genomes from the units of a Soup.
 
-    def __init__(self, soup: Soup):
+    Parameters
+    ----------
+    soup : Soup
+        The Soup of units to draw genes from.
+    compact : bool, optional
+        If True, genomes are spawned as CompactGenomes. Default is False.
+
+    """
+
+    def __init__(self, soup: Soup, compact: bool = False):
         self.soup = soup
+        self.compact = compact
 
     def spawn_gene(self) -> Expression:
-        return deepcopy(self.soup.random_unit())
+        return self.soup.random_unit()
+
+    def spawn_genes(self, n: int) -> List[Expression]:
+        return self.soup.random_units(n)
+
+    def spawn_compact_genome_of_size(self, size: int) -> CompactGenome:
+        units = self.soup.units
+        dtype = code_dtype(len(units) - 1)
+        codes = self.soup.random_unit_ndxs(size).astype(dtype)
+        is_erc = np.array([isinstance(unit, ErcGenerator) for unit in units], dtype=bool)[codes]
+        constants = [units[code].create_constant() for code in codes[is_erc].tolist()]
+        codes[is_erc] = erc_code(dtype)
+        return CompactGenome(codes, constants)
 
-    def spawn_genome_of_size(self, size: int) -> Sequence[Unit]:
-        return pvector([self.spawn_gene() for _ in range(size)])
+    def spawn_genome_of_size(self, size: int) -> Union[Sequence[Unit], CompactGenome]:
+        if self.compact:
+            return self.spawn_compact_genome_of_size(size)
+        return pvector(self.soup.random_units(size))
 
     def spawn_genome(self, min_size: int, max_size: int) -> Sequence[Unit]:
         size = random.randint(min_size, max_size)
         return self.spawn_genome_of_size(size)
 
     def spawn_push_code_of_size(self, size: int) -> Sequence[Expression]:
-        return genome_to_push_code(self.spawn_genome_of_size(size))
+        return genome_to_push_code(self.soup.random_units(size))
 
     def spawn_push_code(self, min_size: int, max_size: int) -> Sequence[Expression]:
-        return genome_to_push_code(self.spawn_genome(min_size, max_size))
+        return self.spawn_push_code_of_size(random.randint(min_size, max_size))
@@ -5,14 +5,16 @@ algorithms to create "child" genomes from "parent" genomes.
 
 """
 from abc import ABC, abstractmethod
-from typing import Sequence, Union, Tuple
+from typing import Callable, List, Sequence, Union, Tuple
 import math
 from copy import copy
 
+import numpy as np
 from numpy.random import random, choice
 from pyrsistent import pvector, PVector
 
 from push4.collections import DiscreteProbDistrib
+from push4.gp.genome import CompactGenome, flatten_compact, unflatten_compact
 from push4.gp.individual import Genome
 from push4.gp.spawn import Spawner
 from push4.lang.expr import Expression
@@ -67,6 +69,19 @@ class VariationOperator(ABC):
         """
         pass
 
+    def produce_batch(self, parents: Sequence[Sequence[Genome]], spawner: Spawner) -> List[Genome]:
+        """Produce one child Genome from each list of parent Genomes.
+
+        Parameters
+        ----------
+        parents
+            A list of parent Genomes for each child.
+        spawner
+            A GeneSpawner that can be used to produce new genes (aka Atoms).
+
+        """
+        return [self.produce(p, spawner) for p in parents]
+
 
 class VariationSet(VariationOperator):
     """A collection of VariationOperator and how frequently to use them."""
@@ -93,6 +108,28 @@ class VariationSet(VariationOperator):
         op = self.ops.sample()
         return op.produce(parents, spawner)
 
+    def produce_batch(self, parents: Sequence[Sequence[Genome]], spawner: Spawner) -> List[Genome]:
+        """Produce one child Genome from each list of parent Genomes.
+
+        The children made by each operator are produced in one batch.
+
+        Parameters
+        ----------
+        parents
+            A list of parent Genomes for each child.
+        spawner
+            A GeneSpawner that can be used to produce new genes (aka Atoms).
+
+        """
+        op_ndxs = self.ops.sample_n(len(parents))
+        children = [None] * len(parents)
+        for op_ndx in np.unique(op_ndxs):
+            child_ndxs = np.flatnonzero(op_ndxs == op_ndx)
+            op_children = self.ops.elements[op_ndx].produce_batch([parents[i] for i in child_ndxs], spawner)
+            for i, child in zip(child_ndxs, op_children):
+                children[i] = child
+        return children
+
 
 class VariationPipeline(VariationOperator):
     """Variation operator that sequentially applies multiple others variation operators.
@@ -131,6 +168,38 @@ class VariationPipeline(VariationOperator):
             child = op.produce([child] + parents[1:], spawner)
         return child
 
+    def produce_batch(self, parents: Sequence[Sequence[Genome]], spawner: Spawner) -> List[Genome]:
+        """Produce one child Genome from each list of parent Genomes.
+
+        Consecutive mutations are applied to all children at once, without
+        converting the children back to Genomes between them.
+
+        Parameters
+        ----------
+        parents
+            A list of parent Genomes for each child.
+        spawner
+            A GeneSpawner that can be used to produce new genes (aka Atoms).
+
+        """
+        for p in parents:
+            self.checknum_parents(p)
+        children = [p[0] for p in parents]
+        ndx = 0
+        while ndx < len(self.operators):
+            if isinstance(self.operators[ndx], _GeneMutation):
+                flat = _FlatGenomes(children)
+                while ndx < len(self.operators) and isinstance(self.operators[ndx], _GeneMutation):
+                    self.operators[ndx].mutate_flat(flat, spawner)
+                    ndx += 1
+                children = flat.genomes()
+            else:
+                children = self.operators[ndx].produce_batch(
+                    [[child] + list(p[1:]) for child, p in zip(children, parents)], spawner
+                )
+                ndx += 1
+        return children
+
 
 # Utilities
 
@@ -154,29 +223,118 @@ def _gaussian_noise_factor():
 
 # Mutations
 
-class DeletionMutation(VariationOperator):
-    """Uniformly randomly removes some Atoms from parent.
+def _object_array(items: Sequence) -> np.ndarray:
+    arr = np.empty(len(items), dtype=object)
+    # Assigning one by one is much faster than assigning the list, which numpy inspects for nested sequences.
+    for i, item in enumerate(items):
+        arr[i] = item
+    return arr
+
+
+class _FlatGenomes:
+    """The genes of many genomes in one array, and the index in the array where each genome starts.
+
+    The last element of the starts is the total number of genes. The genes of compact genomes
+    are their codes, and the constants of their ERC genes are kept in `constants`.
+    """
+
+    def __init__(self, genomes: Sequence[Genome]):
+        if len(genomes) > 0 and isinstance(genomes[0], CompactGenome):
+            self.genes, self.starts, self.constants = flatten_compact(genomes)
+        else:
+            self.starts = np.zeros(len(genomes) + 1, dtype=int)
+            np.cumsum([len(g) for g in genomes], out=self.starts[1:])
+            self.genes = _object_array([gene for genome in genomes for gene in genome])
+            self.constants = None
+
+    def spawn_genes(self, n: int, spawner: Spawner) -> np.ndarray:
+        """Return `n` new random genes in the representation of the flattened genomes."""
+        if self.constants is None:
+            return _object_array(spawner.spawn_genes(n))
+        codes, _, _ = flatten_compact([spawner.spawn_compact_genome_of_size(n)], self.constants)
+        return codes
+
+    def genomes(self) -> List[Genome]:
+        if self.constants is not None:
+            return unflatten_compact(self.genes, self.starts, self.constants)
+        gene_list = self.genes.tolist()
+        return [pvector(gene_list[self.starts[i]:self.starts[i + 1]]) for i in range(len(self.starts) - 1)]
+
+
+def deletion_kernel(genes: np.ndarray, starts: np.ndarray, rate: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Remove each gene of the flattened genomes with probability `rate`.
 
     Parameters
     ----------
-    deletion_rate : float
-        The probablility of removing any given Atom in the parent Genome.
-        Default is 0.01.
+    genes
+        Array of the genes of all genomes, one genome after the other.
+    starts
+        The index in `genes` where each genome starts, followed by the number of genes.
+    rate
+        The probability of removing any given gene.
 
-    Attributes
+    Returns
+    -------
+    The genes and starts of the mutated genomes.
+
+    """
+    n_genomes = len(starts) - 1
+    keep = random(len(genes)) >= rate
+    genome_ndxs = np.repeat(np.arange(n_genomes), np.diff(starts))
+    kept_per_genome = np.bincount(genome_ndxs[keep], minlength=n_genomes)
+    new_starts = np.zeros(len(starts), dtype=int)
+    np.cumsum(kept_per_genome, out=new_starts[1:])
+    return genes[keep], new_starts
+
+
+def addition_kernel(genes: np.ndarray,
+                    starts: np.ndarray,
+                    rate: float,
+                    spawn_genes: Callable[[int], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Add a new gene before each gene, and at the end, of the flattened genomes with probability `rate`.
+
+    Parameters
     ----------
-    rate : float
-        The probablility of removing any given Atom in the parent Genome.
-        Default is 0.01.
-    num_parents : int
-        Number of parent Genomes the operator needs to produce a child
-        Individual.
+    genes
+        Array of the genes of all genomes, one genome after the other.
+    starts
+        The index in `genes` where each genome starts, followed by the number of genes.
+    rate
+        The probability of adding a new gene at any given point in a genome.
+    spawn_genes
+        Function which returns an array of the given number of new genes.
+
+    Returns
+    -------
+    The genes and starts of the mutated genomes.
 
     """
+    n_genomes = len(starts) - 1
+    # A genome of n genes has n + 1 slots. Each slot may receive a new gene, and all
+    # but the last slot of each genome are followed by an existing gene.
+    slot_starts = starts + np.arange(n_genomes + 1)
+    has_gene = np.ones(slot_starts[-1], dtype=bool)
+    has_gene[slot_starts[1:] - 1] = False
+    add = random(len(has_gene)) < rate
+    slot_ends = np.cumsum(add.astype(int) + has_gene)
+    slot_out = slot_ends - add - has_gene
+    child_genes = np.empty(slot_ends[-1] if len(slot_ends) > 0 else 0, dtype=genes.dtype)
+    child_genes[slot_out[add]] = spawn_genes(int(add.sum()))
+    child_genes[(slot_out + add)[has_gene]] = genes
+    new_starts = np.append(slot_out[slot_starts[:-1]], len(child_genes))
+    return child_genes, new_starts
+
+
+class _GeneMutation(VariationOperator, ABC):
+    """A mutation of a single parent which acts on the genes of many flattened genomes at once."""
 
-    def __init__(self, deletion_rate: float = 0.01):
+    def __init__(self):
         super().__init__(1)
-        self.rate = deletion_rate
+
+    @abstractmethod
+    def mutate_flat(self, flat: _FlatGenomes, spawner: Spawner):
+        """Mutate the flattened genomes in place."""
+        pass
 
     def produce(self, parents: Sequence[Genome], spawner: Spawner) -> Genome:
         """Produce a child Genome from parent Genomes and optional Spawner.
@@ -190,15 +348,57 @@ class DeletionMutation(VariationOperator):
 
         """
         self.checknum_parents(parents)
-        new_genome = pvector()
-        for gene in parents[0]:
-            if random() < self.rate:
-                continue
-            new_genome = new_genome.append(gene)
-        return pvector(new_genome)
+        flat = _FlatGenomes(parents[:1])
+        self.mutate_flat(flat, spawner)
+        return flat.genomes()[0]
+
+    def produce_batch(self, parents: Sequence[Sequence[Genome]], spawner: Spawner) -> List[Genome]:
+        """Produce one child Genome from each list of parent Genomes.
+
+        Parameters
+        ----------
+        parents
+            A list of parent Genomes for each child.
+        spawner
+            A GeneSpawner that can be used to produce new genes (aka Atoms).
+
+        """
+        for p in parents:
+            self.checknum_parents(p)
+        flat = _FlatGenomes([p[0] for p in parents])
+        self.mutate_flat(flat, spawner)
+        return flat.genomes()
+
+
+class DeletionMutation(_GeneMutation):
+    """Uniformly randomly removes some Atoms from parent.
 
+    Parameters
+    ----------
+    deletion_rate : float
+        The probablility of removing any given Atom in the parent Genome.
+        Default is 0.01.
 
-class AdditionMutation(VariationOperator):
+    Attributes
+    ----------
+    rate : float
+        The probablility of removing any given Atom in the parent Genome.
+        Default is 0.01.
+    num_parents : int
+        Number of parent Genomes the operator needs to produce a child
+        Individual.
+
+    """
+
+    def __init__(self, deletion_rate: float = 0.01):
+        super().__init__()
+        self.rate = deletion_rate
+
+    def mutate_flat(self, flat: _FlatGenomes, spawner: Spawner):
+        flat.genes, flat.starts = deletion_kernel(flat.genes, flat.starts, self.rate)
+
+
+class AdditionMutation(_GeneMutation):
     """Uniformly randomly adds some Atoms to parent.
 
     Parameters
@@ -219,29 +419,13 @@ class AdditionMutation(VariationOperator):
     """
 
     def __init__(self, addition_rate: float = 0.01):
-        super().__init__(1)
+        super().__init__()
         self.rate = addition_rate
 
-    def produce(self, parents: Sequence[Genome], spawner: Spawner) -> Genome:
-        """Produce a child Genome from parent Genomes and optional Spawner.
-
-        Parameters
-        ----------
-        parents
-            A list of parent Genomes given to the operator.
-        spawner
-            A Spawner that can be used to produce new genes (aka Atoms).
-
-        """
-        self.checknum_parents(parents)
-        new_genome = pvector()
-        for gene in parents[0]:
-            if random() < self.rate:
-                new_genome = new_genome.append(spawner.spawn_gene())
-            new_genome = new_genome.append(gene)
-        if random() < self.rate:
-            new_genome = new_genome.append(spawner.spawn_gene())
-        return pvector(new_genome)
+    def mutate_flat(self, flat: _FlatGenomes, spawner: Spawner):
+        flat.genes, flat.starts = addition_kernel(
+            flat.genes, flat.starts, self.rate, lambda n: flat.spawn_genes(n, spawner)
+        )
 
 
 def umad(addition_rate: float, deletion_rate: float):
@@ -301,9 +485,10 @@ class Alternation(VariationOperator):
 
         """
         self.checknum_parents(parents)
-        gn1 = copy(parents[0])
-        gn2 = copy(parents[1])
-        new_genome = pvector()
+        gn1 = parents[0]
+        gn2 = parents[1]
+        # Indices of the genes to pull, into the genes of both parents one after the other.
+        picks = []
         # Random pick which parent to start from
         use_parent_1 = choice([True, False])
         loop_times = len(gn1)
@@ -319,15 +504,18 @@ class Alternation(VariationOperator):
             else:
                 # Pull gene from parent
                 if use_parent_1:
-                    new_genome = new_genome.append(gn1[i])
+                    picks.append(i)
                 else:
-                    new_genome = new_genome.append(gn2[i])
+                    picks.append(len(gn1) + i)
                 i = int(i + 1)
             # Change loop stop condition
             loop_times = len(gn1)
             if not use_parent_1:
                 loop_times = len(gn2)
-        return new_genome
+        flat = _FlatGenomes([gn1, gn2])
+        flat.genes = flat.genes[np.array(picks, dtype=int)]
+        flat.starts = np.array([0, len(picks)])
+        return flat.genomes()[0]
 
 
 # Other
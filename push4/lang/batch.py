@@ -0,0 +1,270 @@
+import sys
+from copy import copy
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from push4.lang.cse import value_numbers
+from push4.lang.expr import Expression, Constant, Input, FunctionLike
+from push4.lang.hof import MapExpr, FilterExpr
+
+# A column holds the value of one expression for every case in a batch. Columns of
+# int, float or bool values may be NumPy arrays, all other columns are lists.
+Column = Union[List[Any], np.ndarray]
+
+# Integers outside of this bound are never put in arrays because NumPy's fixed width
+# integers could overflow where Python's integers would not.
+_MAX_ARRAY_INT = 2 ** 31
+
+_kernels: Dict[Callable, Callable[..., Optional[np.ndarray]]] = {}
+
+
+def register_kernel(fn: Callable, kernel: Callable[..., Optional[np.ndarray]]):
+    """Register a vectorized version of `fn` to use during batch evaluation.
+
+    The kernel is called with the same keyword arguments as `fn`, each one a NumPy
+    array of int64, float64 or bool values. It must return an array holding the value
+    `fn` returns for each element, or None if it cannot produce exactly those values.
+    When a kernel returns None, `fn` is applied to one case at a time.
+    """
+    _kernels[fn] = kernel
+
+
+class _CaseStdout:
+    """A stdout replacement that sends output to the buffer of the current case."""
+
+    def __init__(self, n_cases: int):
+        self.buffers = [[] for _ in range(n_cases)]
+        self.case = 0
+
+    def write(self, s: str):
+        self.buffers[self.case].append(s)
+        return len(s)
+
+    def flush(self):
+        pass
+
+    def getvalues(self) -> List[str]:
+        return ["".join(b) for b in self.buffers]
+
+
+def _to_list(col: Column) -> List[Any]:
+    if isinstance(col, np.ndarray):
+        return col.tolist()
+    return col
+
+
+def _input_column(values: Union[Sequence, np.ndarray]) -> Column:
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind == "b":
+            return values
+        if values.dtype.kind in "iu" and (len(values) == 0 or np.abs(values).max() < _MAX_ARRAY_INT):
+            return values.astype(np.int64)
+        if values.dtype.kind == "f":
+            return values.astype(np.float64)
+    return list(_to_list(values))
+
+
+def _to_array(col: Column, failed: np.ndarray) -> Optional[np.ndarray]:
+    """Return the column as an array, or None if its values cannot be put in an array exactly."""
+    if not isinstance(col, np.ndarray):
+        alive = [v for v, f in zip(col, failed) if not f]
+        if len(alive) == 0:
+            return None
+        typ = type(alive[0])
+        if typ not in (int, float, bool) or any(type(v) is not typ for v in alive):
+            return None
+        filler = typ(0)
+        col = np.array([filler if f else v for v, f in zip(col, failed)])
+    if col.dtype.kind == "i" and len(col) > 0 and np.abs(col).max() >= _MAX_ARRAY_INT:
+        return None
+    if col.dtype.kind == "f" and not np.isfinite(col[~failed]).all():
+        return None
+    return col
+
+
+class BatchEvaluator:
+    """Evaluates an Expression tree on many cases at once, one node at a time.
+
+    Functions with a registered kernel (see `register_kernel`) are applied to whole
+    columns of values. Other functions are applied to one case at a time. A case which
+    raises an error is marked as failed and is skipped by all later nodes. The column of
+    each distinct pure subtree is computed once and shared by its occurrences.
+
+    Parameters
+    ----------
+    n_cases : int
+        The number of cases in the batch.
+    stdout : _CaseStdout
+        Receives all printed output, sorted by case.
+    row_case : np.ndarray
+        The index, in the stdout buffers, of the case that each row belongs to.
+    numbers : Dict[int, Optional[int]]
+        The value numbers of the nodes of the tree, from `value_numbers`. If None, no
+        subtrees are shared.
+
+    """
+
+    def __init__(self,
+                 n_cases: int,
+                 stdout: _CaseStdout,
+                 row_case: np.ndarray = None,
+                 numbers: Dict[int, Optional[int]] = None):
+        self.n_cases = n_cases
+        self.stdout = stdout
+        self.row_case = row_case
+        if row_case is None:
+            self.row_case = np.arange(n_cases)
+        self.numbers = {} if numbers is None else numbers
+        self.failed = np.zeros(n_cases, dtype=bool)
+        self._columns = {}
+
+    def _alive(self) -> np.ndarray:
+        return np.flatnonzero(~self.failed)
+
+    def eval(self, expr: Expression, scope: Mapping[str, Column]) -> Column:
+        number = None
+        if isinstance(expr, (FunctionLike, MapExpr, FilterExpr)):
+            number = self.numbers.get(id(expr))
+            if number is not None and number in self._columns:
+                return self._columns[number]
+        col = self._eval_node(expr, scope)
+        if number is not None:
+            self._columns[number] = col
+        return col
+
+    def _eval_node(self, expr: Expression, scope: Mapping[str, Column]) -> Column:
+        if isinstance(expr, Constant):
+            if isinstance(expr.value, (int, float, bool, str)):
+                return [expr.value] * self.n_cases
+            return [copy(expr.value) for _ in range(self.n_cases)]
+        elif isinstance(expr, Input):
+            if expr.symbol not in scope:
+                self.failed[:] = True
+                return [None] * self.n_cases
+            return scope[expr.symbol]
+        elif isinstance(expr, FunctionLike):
+            arg_cols = {}
+            for nm, child in expr.children.items():
+                arg_cols[nm] = self.eval(child, scope)
+            return self._apply(expr.fn, arg_cols)
+        elif isinstance(expr, (MapExpr, FilterExpr)) and expr.children["func"].is_pure():
+            return self._eval_hof(expr, scope)
+        else:
+            return self._eval_each(expr, scope)
+
+    def _apply(self, fn: Callable, arg_cols: Dict[str, Column]) -> Column:
+        kernel = _kernels.get(fn)
+        if kernel is not None:
+            arrays = {nm: _to_array(col, self.failed) for nm, col in arg_cols.items()}
+            if all(arr is not None for arr in arrays.values()):
+                try:
+                    with np.errstate(all="ignore"):
+                        result = kernel(**arrays)
+                except Exception:
+                    result = None
+                if result is not None:
+                    return result
+        arg_lists = {nm: _to_list(col) for nm, col in arg_cols.items()}
+        result = [None] * self.n_cases
+        for i in self._alive():
+            self.stdout.case = self.row_case[i]
+            try:
+                result[i] = fn(**{nm: col[i] for nm, col in arg_lists.items()})
+            except Exception:
+                self.failed[i] = True
+        return result
+
+    def _eval_hof(self, expr: Union[MapExpr, FilterExpr], scope: Mapping[str, Column]) -> Column:
+        seq_col = _to_list(self.eval(expr.children["seq"], scope))
+        seqs = [[] for _ in range(self.n_cases)]
+        for i in self._alive():
+            try:
+                seqs[i] = list(seq_col[i])
+            except Exception:
+                self.failed[i] = True
+        # All elements of all cases are evaluated by one batch. Rows are grouped by case.
+        lengths = np.array([0 if f else len(s) for s, f in zip(seqs, self.failed)], dtype=int)
+        elements = [el for s, f in zip(seqs, self.failed) if not f for el in s]
+        row_parent = np.repeat(np.arange(self.n_cases), lengths)
+        body_scope = {"_0": elements}
+        for symbol, col in scope.items():
+            if isinstance(col, np.ndarray):
+                body_scope[symbol] = col[row_parent]
+            else:
+                body_scope[symbol] = [col[p] for p in row_parent]
+        body = BatchEvaluator(len(elements), self.stdout, self.row_case[row_parent], self.numbers)
+        body_values = _to_list(body.eval(expr.children["func"], body_scope))
+        if isinstance(expr, FilterExpr):
+            keep = [False] * len(elements)
+            for i in np.flatnonzero(~body.failed):
+                try:
+                    keep[i] = bool(body_values[i])
+                except Exception:
+                    body.failed[i] = True
+        self.failed[row_parent[body.failed]] = True
+
+        result = [None] * self.n_cases
+        start = 0
+        for i, ln in enumerate(lengths):
+            end = start + ln
+            if not self.failed[i]:
+                if isinstance(expr, MapExpr):
+                    result[i] = body_values[start:end]
+                else:
+                    result[i] = [el for el, k in zip(elements[start:end], keep[start:end]) if k]
+            start = end
+        return result
+
+    def _eval_each(self, expr: Expression, scope: Mapping[str, Column]) -> Column:
+        """Evaluate `expr` with the tree interpreter, one case at a time."""
+        scope_lists = {symbol: _to_list(col) for symbol, col in scope.items()}
+        result = [None] * self.n_cases
+        for i in self._alive():
+            self.stdout.case = self.row_case[i]
+            try:
+                result[i] = expr.eval(**{symbol: col[i] for symbol, col in scope_lists.items()})
+            except Exception:
+                self.failed[i] = True
+        return result
+
+
+def eval_batch(root: Expression,
+               columns: Mapping[str, Union[Sequence, np.ndarray]],
+               n_cases: int = None) -> Tuple[List[Any], np.ndarray, List[str]]:
+    """Evaluate `root` on every case given by column oriented inputs.
+
+    Parameters
+    ----------
+    root : Expression
+        The root of a reified expression tree.
+    columns : Mapping[str, Union[Sequence, np.ndarray]]
+        The values of each input symbol for every case.
+    n_cases : int, optional
+        The number of cases. Only required if `columns` is empty.
+
+    Returns
+    -------
+    outputs : List[Any]
+        The output of each case. None for cases which raised an error.
+    failed : np.ndarray
+        Boolean mask of the cases which raised an error.
+    stdout : List[str]
+        The text printed by each case.
+
+    """
+    if n_cases is None:
+        lengths = set(len(col) for col in columns.values())
+        assert len(lengths) == 1, "Batch columns must be non-empty and of equal length."
+        n_cases = lengths.pop()
+    scope = {symbol: _input_column(col) for symbol, col in columns.items()}
+    stdout = _CaseStdout(n_cases)
+    evaluator = BatchEvaluator(n_cases, stdout, numbers=value_numbers(root))
+    old_stdout = sys.stdout
+    sys.stdout = stdout
+    try:
+        outputs = _to_list(evaluator.eval(root, scope))
+    finally:
+        sys.stdout = old_stdout
+    outputs = [None if f else o for o, f in zip(outputs, evaluator.failed)]
+    return outputs, evaluator.failed, stdout.getvalues()
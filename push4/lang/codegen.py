@@ -0,0 +1,234 @@
+from copy import copy
+from typing import Any, Callable, List, Mapping, Optional
+
+from push4.lang.cse import value_numbers
+from push4.lang.expr import Expression, Constant, Input, FunctionLike
+from push4.lang.hof import MapExpr, FilterExpr
+
+
+# Constant values of these types are never copied by the compiled code. Constant.eval returns
+# a copy of its value, which is only observable for mutable values.
+_IMMUTABLE_TYPES = frozenset([int, float, bool, str, bytes, complex, type(None)])
+
+CompiledProgram = Callable[[Mapping[str, Any]], Any]
+
+
+class CodeGen:
+    """Translates a reified Expression tree into the source of a single Python function.
+
+    The generated function takes the mapping of input symbols to values which would
+    otherwise be passed to `Expression.eval` as keyword arguments. Every node is emitted
+    as one assignment to a local variable, in the same order the tree interpreter
+    evaluates them. HOF bodies are emitted as nested functions which are called from
+    a list comprehension.
+
+    Pure subtrees of a HOF body whose values do not depend on the element, and are of
+    immutable types, are hoisted out of the body. They are computed once, before the
+    body, if the sequence is not empty.
+
+    Structurally identical pure subtrees (see `value_numbers`) are computed once, and
+    later occurrences reuse the variable holding their value wherever it is in scope.
+
+    Runtime errors raised by the generated code are not wrapped the way that
+    `FunctionLike.eval` wraps them. Callers which must reproduce the interpreter's
+    errors exactly (see `Dag.eval`) should re-evaluate with the interpreter when the
+    compiled function raises.
+    """
+
+    def __init__(self, name: str = "_program"):
+        self.name = name
+        self.namespace = {"_copy": copy}
+        self._bound = {}
+        self._inputs = {}
+        self._hoisted = {}
+        self._numbers = {}
+        self._scope = {}
+        self._n_vars = 0
+
+    def _fresh(self, prefix: str) -> str:
+        self._n_vars += 1
+        return "{p}{n}".format(p=prefix, n=self._n_vars)
+
+    def _bind(self, obj: Any, prefix: str) -> str:
+        """Return the global name the generated code uses to refer to `obj`."""
+        key = (prefix, id(obj))
+        if key not in self._bound:
+            nm = self._fresh(prefix)
+            self.namespace[nm] = obj
+            self._bound[key] = (nm, obj)
+        return self._bound[key][0]
+
+    def _input(self, symbol: str) -> str:
+        if symbol not in self._inputs:
+            self._inputs[symbol] = self._fresh("_i")
+        return self._inputs[symbol]
+
+    @staticmethod
+    def _invariants(body: Expression, hof_depth: int) -> List[Expression]:
+        """The largest hoistable subtrees of the body of a HOF at `hof_depth` which do not depend on its element.
+
+        The body of the outermost HOF depends on its element through `_0`. Nested HOFs
+        cannot refer to their own element, so none of their bodies depend on it.
+        """
+        depends = {}
+
+        def depends_on_element(expr: Expression) -> bool:
+            if id(expr) not in depends:
+                if isinstance(expr, Input):
+                    depends[id(expr)] = hof_depth == 0 and expr.symbol == "_0"
+                else:
+                    depends[id(expr)] = any([depends_on_element(child) for child in expr.children.values()])
+            return depends[id(expr)]
+
+        invariants = []
+        visited = set()
+        stack = [body]
+        while len(stack) > 0:
+            expr = stack.pop()
+            if id(expr) in visited or isinstance(expr, (Constant, Input)):
+                continue
+            visited.add(id(expr))
+            if not depends_on_element(expr) and expr.dtype() in _IMMUTABLE_TYPES and expr.is_pure():
+                invariants.append(expr)
+            else:
+                stack.extend(reversed(list(expr.children.values())))
+        return invariants
+
+    def _hoist(self, body: Expression, lines: List[str], indent: str, hof_depth: int) -> List[int]:
+        """Emit the invariants of a HOF body, so the body uses their values. Returns their keys in `_hoisted`."""
+        keys = []
+        for expr in self._invariants(body, hof_depth):
+            var = self._emit(expr, lines, indent, hof_depth)
+            number = self._numbers.get(id(expr))
+            if number is not None and number not in self._hoisted:
+                self._hoisted[number] = var
+                keys.append(number)
+        return keys
+
+    def _shared_number(self, expr: Expression) -> Optional[int]:
+        """The value number of a node whose value is shared by all its occurrences, or None."""
+        if isinstance(expr, (FunctionLike, MapExpr, FilterExpr)):
+            return self._numbers.get(id(expr))
+        return None
+
+    def _emit(self, expr: Expression, lines: List[str], indent: str, hof_depth: int) -> str:
+        """Emit the statements which compute `expr` and return the name holding its value."""
+        number = self._shared_number(expr)
+        if number is not None:
+            var = self._hoisted.get(number, self._scope.get(number))
+            if var is not None:
+                return var
+        var = self._emit_node(expr, lines, indent, hof_depth)
+        if number is not None:
+            self._scope[number] = var
+        return var
+
+    def _emit_node(self, expr: Expression, lines: List[str], indent: str, hof_depth: int) -> str:
+        if isinstance(expr, Constant):
+            const = self._bind(expr.value, "_c")
+            if type(expr.value) in _IMMUTABLE_TYPES:
+                return const
+            var = self._fresh("_v")
+            lines.append("{ind}{v} = _copy({c})".format(ind=indent, v=var, c=const))
+            return var
+        elif isinstance(expr, Input):
+            # HOF bodies see the element of the outermost HOF as `_0`. Inner HOFs scope
+            # their element under `_0` but the enclosing scope overwrites it.
+            if hof_depth > 0 and expr.symbol == "_0":
+                return "_0"
+            return self._input(expr.symbol)
+        elif isinstance(expr, FunctionLike):
+            assert expr.reified, "Cannot compile a Function expression that has not been reified."
+            args = ["{nm}={v}".format(nm=nm, v=self._emit(child, lines, indent, hof_depth))
+                    for nm, child in expr.children.items()]
+            var = self._fresh("_v")
+            lines.append("{ind}{v} = {f}({a})".format(
+                ind=indent, v=var, f=self._bind(expr.fn, "_f"), a=", ".join(args)
+            ))
+            return var
+        elif isinstance(expr, (MapExpr, FilterExpr)):
+            assert expr.reified, "Cannot compile a HoF expression that has not been reified."
+            seq = self._emit(expr.children["seq"], lines, indent, hof_depth)
+            outer_scope = self._scope
+            # Values computed by the hoisted statements are only assigned if the sequence is not empty.
+            self._scope = dict(outer_scope)
+            hoisted_lines = []
+            hoisted = self._hoist(expr.children["func"], hoisted_lines, indent + "    ", hof_depth)
+            if len(hoisted_lines) > 0:
+                # The interpreter never evaluates the body of a HOF over an empty sequence.
+                lines.append("{ind}if {s}:".format(ind=indent, s=seq))
+                lines += hoisted_lines
+            if hof_depth == 0 and "_0" in self._inputs:
+                # Values outside of HOFs which read an input named `_0` are not valid where `_0` is the element.
+                self._scope = {n: var for n, var in self._scope.items() if n not in outer_scope}
+            body_fn = self._fresh("_h")
+            param = "_0" if hof_depth == 0 else self._fresh("_e")
+            lines.append("{ind}def {h}({p}):".format(ind=indent, h=body_fn, p=param))
+            body = self._emit(expr.children["func"], lines, indent + "    ", hof_depth + 1)
+            lines.append("{ind}    return {b}".format(ind=indent, b=body))
+            for key in hoisted:
+                del self._hoisted[key]
+            self._scope = outer_scope
+            var = self._fresh("_v")
+            if isinstance(expr, MapExpr):
+                comprehension = "[{h}(_el) for _el in {s}]"
+            else:
+                comprehension = "[_el for _el in {s} if {h}(_el)]"
+            lines.append("{ind}{v} = {c}".format(ind=indent, v=var, c=comprehension.format(h=body_fn, s=seq)))
+            return var
+        raise NotImplementedError("Cannot compile expression of type " + type(expr).__name__)
+
+    def _read_inputs(self) -> List[str]:
+        return ["    {loc} = _kw[{sym!r}]".format(loc=local, sym=symbol) for symbol, local in self._inputs.items()]
+
+    def source(self, root: Expression) -> str:
+        """Return the source code of a function which evaluates `root`."""
+        self._numbers = value_numbers(root)
+        body = []
+        ret = self._emit(root, body, "    ", 0)
+        lines = ["def {nm}(_kw):".format(nm=self.name)]
+        lines += self._read_inputs()
+        lines += body
+        lines.append("    return {r}".format(r=ret))
+        return "\n".join(lines)
+
+    def hof_body_source(self, body: Expression) -> str:
+        """Return the source code of a function which returns the body of a HOF as a function of its element.
+
+        The outer function takes the mapping of input symbols to values of the HOF and
+        reads the inputs once. The returned function takes the element as `_0`. The
+        invariants of the body are computed by the outer function.
+        """
+        self._numbers = value_numbers(body)
+        hoisted_lines = []
+        self._hoist(body, hoisted_lines, "    ", 0)
+        inner = []
+        ret = self._emit(body, inner, "        ", 1)
+        lines = ["def {nm}(_kw):".format(nm=self.name)]
+        lines += self._read_inputs()
+        lines += hoisted_lines
+        lines.append("    def _body(_0):")
+        lines += inner
+        lines.append("        return {r}".format(r=ret))
+        lines.append("    return _body")
+        return "\n".join(lines)
+
+    def _exec(self, src: str) -> Callable:
+        exec(compile(src, "<push4 {nm}>".format(nm=self.name), "exec"), self.namespace)
+        return self.namespace[self.name]
+
+    def compile(self, root: Expression) -> CompiledProgram:
+        """Return a function which evaluates `root` given a mapping of input symbols to values."""
+        return self._exec(self.source(root))
+
+    def compile_hof_body(self, body: Expression) -> Callable[[Mapping[str, Any]], Callable[[Any], Any]]:
+        """Return a function which takes the inputs of a HOF and returns its body as a function of its element."""
+        return self._exec(self.hof_body_source(body))
+
+
+def compile_expr(root: Expression) -> CompiledProgram:
+    return CodeGen().compile(root)
+
+
+def compile_hof_body(body: Expression) -> Callable[[Mapping[str, Any]], Callable[[Any], Any]]:
+    return CodeGen("_hof_body").compile_hof_body(body)
@@ -0,0 +1,61 @@
+"""The :mod:`cse` module finds the structurally identical subtrees of expression trees.
+
+Push shares the nodes of identical subtrees it builds, but trees built by other
+means, or by several NodeTables, may hold equal subtrees as distinct objects.
+Structural hashing numbers every node so that two nodes have the same number only if
+they compute the same value. Evaluators use the numbers to evaluate each distinct
+subtree once and share its value, which is common subexpression elimination.
+
+Only pure subtrees are numbered. Evaluating an impure subtree, such as one that
+prints, a second time is observable, so every occurrence must be evaluated.
+"""
+from typing import Dict, Hashable, Optional
+
+from push4.lang.expr import Expression, Constant, Input, FunctionLike
+from push4.lang.hof import HOF
+
+_SHARED_VALUE_TYPES = (int, float, str, bool, type(None))
+
+
+def _structural_key(expr: Expression, child_numbers: tuple) -> Optional[Hashable]:
+    if isinstance(expr, Constant):
+        if type(expr.value) not in _SHARED_VALUE_TYPES:
+            # Values without a faithful repr are only known to be equal to themselves.
+            return Constant, id(expr)
+        # repr tells apart values which compare equal, like 0.0 and -0.0.
+        return Constant, type(expr.value), repr(expr.value), expr.dtype()
+    if isinstance(expr, Input):
+        return Input, expr.symbol, expr.dtype()
+    if isinstance(expr, FunctionLike):
+        if getattr(expr.fn, "impure", False):
+            return None
+        return type(expr), expr.fn, expr.dtype(), child_numbers
+    if isinstance(expr, HOF):
+        return type(expr), expr.dtype(), child_numbers
+    return None
+
+
+def value_numbers(root: Expression) -> Dict[int, Optional[int]]:
+    """Number the nodes of a reified tree so that nodes with the same number compute the same value.
+
+    Returns a mapping from the id of each node to its number, or to None if the node
+    is impure. Leaves are numbered so that their parents can be, but evaluators need not
+    share their values.
+    """
+    numbers = {}
+    keys = {}
+
+    def number(expr: Expression) -> Optional[int]:
+        if id(expr) in numbers:
+            return numbers[id(expr)]
+        child_numbers = tuple((nm, number(child)) for nm, child in expr.children.items())
+        num = None
+        if all(n is not None for _, n in child_numbers):
+            key = _structural_key(expr, child_numbers)
+            if key is not None:
+                num = keys.setdefault(key, len(keys))
+        numbers[id(expr)] = num
+        return num
+
+    number(root)
+    return numbers
@@ -1,34 +1,137 @@
 import sys
 from contextlib import redirect_stdout
-from copy import deepcopy
 from io import StringIO
-from typing import Sequence, Type
+from typing import Sequence, Type, Optional, Mapping, Union, Tuple, List, Any
 
-from push4.lang.expr import Expression
+import numpy as np
+
+from push4.lang.batch import eval_batch
+from push4.lang.codegen import CompiledProgram, compile_expr
+from push4.lang.expr import Expression, Constant, Input, FunctionLike
+
+
+def canonical_form(expr: Expression) -> str:
+    """A string which is equal for two reified expressions only if they compute the same thing.
+
+    Unlike `to_code`, functions are identified by module and qualified name, and every
+    node is annotated with its reified type.
+    """
+    if isinstance(expr, Constant):
+        body = repr(expr.value)
+    elif isinstance(expr, Input):
+        body = "$" + expr.symbol
+    else:
+        if isinstance(expr, FunctionLike):
+            head = "{m}.{q}".format(m=expr.fn.__module__, q=expr.fn.__qualname__)
+        else:
+            head = type(expr).__name__
+        body = "{h}({args})".format(
+            h=head,
+            args=", ".join(["{nm}={c}".format(nm=nm, c=canonical_form(child)) for nm, child in expr.children.items()])
+        )
+    return "{b}:{t}".format(b=body, t=expr.dtype())
 
 
 class Dag:
 
-    def __init__(self, root: Expression):
-        self.root = deepcopy(root)
-        self.root.reify(include_children=True)
+    def __init__(self, root: Expression, compiled: bool = True):
+        # The root is not copied. Nodes built by Push are already reified and may be shared
+        # with other Dags, so only nodes which have not been reified yet are reified here.
+        self.root = root
+        for child in self.root.children.values():
+            if not child.reified:
+                child.reify()
+        if not self.root.reified:
+            self.root.reify()
         self.stdout_buffer = StringIO()
+        self.batch_stdout_buffers = []
+        self.compiled = compiled
+        self._compiled_fn = None
 
     def stdout(self) -> str:
         return self.stdout_buffer.getvalue()
 
+    def batch_stdout(self) -> List[str]:
+        """The text printed by each case of the last call to `eval_batch`."""
+        return self.batch_stdout_buffers
+
+    def compiled_fn(self) -> Optional[CompiledProgram]:
+        """The Dag compiled to a single Python function, or None if it cannot be compiled."""
+        if self._compiled_fn is None:
+            try:
+                self._compiled_fn = compile_expr(self.root)
+            except NotImplementedError:
+                self._compiled_fn = False
+        return self._compiled_fn or None
+
     def eval(self, **kwargs):
+        if self.compiled and "_0" not in kwargs:
+            fn = self.compiled_fn()
+            if fn is not None:
+                # Swaps stdout by hand because redirect_stdout costs as much as a small program.
+                self.stdout_buffer = StringIO()
+                old_stdout = sys.stdout
+                sys.stdout = self.stdout_buffer
+                try:
+                    return fn(kwargs)
+                except Exception:
+                    # Fall through to the interpreter, which raises the error with its usual message.
+                    pass
+                finally:
+                    sys.stdout = old_stdout
+        return self.interpret(**kwargs)
+
+    def interpret(self, **kwargs):
+        """Evaluate the Dag by walking the expression tree."""
         self.stdout_buffer = StringIO()
         with redirect_stdout(self.stdout_buffer):
             ret = self.root.eval(**kwargs)
         return ret
 
+    def eval_batch(self,
+                   columns: Mapping[str, Union[Sequence, np.ndarray]],
+                   n_cases: int = None) -> Tuple[List[Any], np.ndarray]:
+        """Evaluate the Dag on many cases at once, evaluating each node once for all cases.
+
+        Parameters
+        ----------
+        columns : Mapping[str, Union[Sequence, np.ndarray]]
+            The values of each input symbol, one list or array per symbol.
+        n_cases : int, optional
+            The number of cases. Only required if `columns` is empty.
+
+        Returns
+        -------
+        outputs : List[Any]
+            The output of each case. None for cases which raised an error.
+        failed : np.ndarray
+            Boolean mask of the cases which raised an error.
+
+        """
+        outputs, failed, self.batch_stdout_buffers = eval_batch(self.root, columns, n_cases)
+        return outputs, failed
+
+    def size(self) -> int:
+        """The number of distinct nodes in the Dag. Nodes shared by several parents are counted once."""
+        seen = set()
+        stack = [self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if id(node) not in seen:
+                seen.add(id(node))
+                stack.extend(node.children.values())
+        return len(seen)
+
     def return_type(self) -> Type:
         return self.root.dtype()
 
     def to_code(self):
         return self.root.to_code()
 
+    def canonical_code(self) -> str:
+        """Code that is the same for two Dags only if they compute the same function."""
+        return canonical_form(self.root)
+
     def to_def(self, name: str, arg_names: Sequence[str]) -> str:
         return "def {nm}({args}):\n    return {code}".format(
             nm=name,
@@ -39,5 +142,11 @@ class Dag:
     def pprint(self):
         self.root.pprint()
 
+    def __getstate__(self):
+        # Compiled functions cannot be pickled. They are rebuilt on the next eval.
+        state = self.__dict__.copy()
+        state["_compiled_fn"] = None
+        return state
+
     def __eq__(self, other):
         return isinstance(other, Dag) and self.root == other.root
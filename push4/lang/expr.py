@@ -4,11 +4,17 @@ from typing import Any, Callable, Type, get_type_hints, Mapping, Sequence, Dict
 
 import numpy as np
 from pyrsistent import pmap, v
-from pytypes import is_subtype
 
 from push4.collections import POMap
 from push4.lang.node import Node
 from push4.lang.reify import TypeReifier, NoopReifier, Signature, RequiredReifier
+from push4.lang.types import is_subtype
+
+
+def impure(fn: Callable) -> Callable:
+    """Mark a function as having side effects, such as printing to stdout."""
+    fn.impure = True
+    return fn
 
 
 class Expression(Node, ABC):
@@ -36,6 +42,10 @@ class Expression(Node, ABC):
     def to_form(self) -> str:
         ...
 
+    def is_pure(self) -> bool:
+        """True if evaluating the expression has no side effects, such as printing."""
+        return all(child.is_pure() for child in self.children.values())
+
     def __repr__(self) -> str:
         nm = type(self).__name__
         body = self.to_form()
@@ -136,6 +146,9 @@ class FunctionLike(Expression, ABC):
                 f=self.fn, a=fn_kwargs, et=type(e).__name__, e=e
             ))
 
+    def is_pure(self) -> bool:
+        return not getattr(self.fn, "impure", False) and super().is_pure()
+
     def _validate_children(self):
         expected = set(self.args().keys())
         actual = set(self.children.keys())
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
 from abc import abstractmethod, ABC
-from typing import Any, Set, Sequence, Tuple, List
+from typing import Any, Callable, Hashable, Mapping, Optional, Set, Sequence, Tuple, List
 
-from pyrsistent import v, pvector
-from pytypes import is_subtype
+from pyrsistent import v, pvector, PVector
 
 from push4.lang.expr import Expression, Input
+from push4.lang.types import is_subtype
 
 
 def all_nodes_of_type(expr: Expression, cls: type) -> Set:
@@ -25,10 +25,24 @@ class LocalInput(Input):
         self.ndx = ndx
 
 
+def _code_key(code: Sequence) -> Hashable:
+    return tuple(_code_key(el) if isinstance(el, PVector) else id(el) for el in code)
+
+
 class Closure:
 
     def __init__(self, func_def: Sequence[Expression]):
         self.func_def = pvector(func_def)
+        self._code_key = None
+
+    def code_key(self) -> Hashable:
+        """Identities of the elements of the function definition, recursing into nested code blocks.
+
+        Closures made from the same genes have the same key, even if their code blocks are different objects.
+        """
+        if self._code_key is None:
+            self._code_key = _code_key(self.func_def)
+        return self._code_key
 
     def __repr__(self) -> str:
         return str(self.func_def)
@@ -39,6 +53,47 @@ class HOF(Expression, ABC):
     def __init__(self, name: str):
         super().__init__()
         self.name = name
+        self._compiled_body = None
+
+    def _body_of_element(self, kwargs: Mapping[str, Any]) -> Optional[Callable[[Any], Any]]:
+        """The body as a compiled function of the element, with the other inputs bound to `kwargs`.
+
+        Returns None if the body must be interpreted. Only pure bodies are compiled, so a
+        compiled body that raises can be re-evaluated by the interpreter to raise its usual
+        error. Inside the body of another HOF, the enclosing element overrides `_0` and the
+        body is interpreted.
+        """
+        if "_0" in kwargs:
+            return None
+        if self._compiled_body is None:
+            self._compiled_body = False
+            body = self.children["func"]
+            if body.is_pure():
+                # Imported here because the code generator compiles HOFs itself.
+                from push4.lang.codegen import compile_hof_body
+                try:
+                    self._compiled_body = compile_hof_body(body)
+                except NotImplementedError:
+                    pass
+        if not self._compiled_body:
+            return None
+        try:
+            return self._compiled_body(kwargs)
+        except Exception:
+            return None
+
+    def __getstate__(self):
+        # Compiled bodies cannot be pickled. They are rebuilt on the next eval.
+        state = self.__dict__.copy()
+        state["_compiled_body"] = None
+        return state
+
+    @staticmethod
+    def _scope(kwargs: Mapping[str, Any]) -> dict:
+        """The scope of the body, in which `_0` is set to each element unless the enclosing scope sets it."""
+        scope = {"_0": None}
+        scope.update(kwargs)
+        return scope
 
     @abstractmethod
     def inner_func_spec(self) -> Tuple[int, type]:
@@ -53,6 +108,7 @@ class HOF(Expression, ABC):
 
     def _reify(self):
         self._validate_children()
+        self._compiled_body = None
 
 
 class MapExpr(HOF):
@@ -69,11 +125,18 @@ class MapExpr(HOF):
 
     def eval(self, **kwargs):
         seq: List = self.children["seq"].eval(**kwargs)
+        fn = self._body_of_element(kwargs)
+        if fn is not None:
+            try:
+                return [fn(el) for el in seq]
+            except Exception:
+                pass
         func: Expression = self.children["func"]
+        scope = self._scope(kwargs)
         result = []
         for el in seq:
-            scope = {"_0": el}
-            scope.update(kwargs)
+            if "_0" not in kwargs:
+                scope["_0"] = el
             result.append(func.eval(**scope))
         return result
 
@@ -107,11 +170,18 @@ class FilterExpr(HOF):
 
     def eval(self, **kwargs):
         seq: List = self.children["seq"].eval(**kwargs)
+        fn = self._body_of_element(kwargs)
+        if fn is not None:
+            try:
+                return [el for el in seq if fn(el)]
+            except Exception:
+                pass
         body: Expression = self.children["func"]
+        scope = self._scope(kwargs)
         result = []
         for el in seq:
-            scope = {"_0": el}
-            scope.update(kwargs)
+            if "_0" not in kwargs:
+                scope["_0"] = el
             if body.eval(**scope):
                 result.append(el)
         return result
@@ -1,15 +1,17 @@
+from collections import OrderedDict
 from copy import copy
 from io import StringIO
-from typing import Optional, Type, Sequence, Mapping, MutableSequence, List
+from typing import Optional, Type, Sequence, Mapping, MutableSequence, List, Tuple, Hashable
+from weakref import WeakValueDictionary
 
 from pyrsistent import m, PVector
-from pytypes import is_subtype, get_Generic_itemtype
 
 from push4.collections import POMap
 from push4.lang.dag import Dag
 from push4.lang.expr import Expression, Constant, Function, Input, FunctionLike
 from push4.lang.hof import HOF, Closure, LocalInput
 from push4.lang.reify import TypeReifier, Signature
+from push4.lang.types import is_subtype, get_Generic_itemtype
 
 
 class PushStack(list):
@@ -70,28 +72,279 @@ class PushStack(list):
         return list(self) == list(other)
 
 
+MAX_DEPTH = 50
+
+
+class TypedStack:
+    """A stack of Expressions which finds the top Expression of a given type without scanning the stack.
+
+    Expressions are kept in one bucket per dtype, tagged with their position in the
+    stack. The top Expression of a required type is the one with the highest position
+    among the tops of the buckets of its subtypes, so finding it costs one (memoized)
+    subtype check per distinct dtype on the stack. Expressions of depth `MAX_DEPTH` or
+    more are never popped and are kept in a separate bucket.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._next_position = 0
+        self._size = 0
+
+    def is_empty(self) -> bool:
+        return self._size == 0
+
+    def push(self, expr: Expression):
+        key = expr.dtype() if expr.depth < MAX_DEPTH else None
+        self._buckets.setdefault(key, []).append((self._next_position, expr))
+        self._next_position += 1
+        self._size += 1
+        return self
+
+    def pop_top_valid(self, typ: Type) -> Optional[Tuple[Type, int, Expression]]:
+        """Remove the top Expression whose dtype is a subtype of `typ`.
+
+        Returns the dtype, position and the Expression, which can be put back in
+        place with `restore`, or None if there is no such Expression.
+        """
+        top_key = None
+        top_position = -1
+        for key, bucket in self._buckets.items():
+            if len(bucket) > 0 and bucket[-1][0] > top_position and key is not None and is_subtype(key, typ):
+                top_key = key
+                top_position = bucket[-1][0]
+        if top_position < 0:
+            return None
+        position, expr = self._buckets[top_key].pop()
+        self._size -= 1
+        return top_key, position, expr
+
+    def restore(self, popped: Sequence[Tuple[Type, int, Expression]]):
+        """Put back Expressions removed by `pop_top_valid`, given in the order they were popped."""
+        for key, position, expr in reversed(popped):
+            self._buckets[key].append((position, expr))
+            self._size += 1
+        return self
+
+    def flush(self):
+        self._buckets = {}
+        self._size = 0
+        return self
+
+    def pprint(self):
+        for el in reversed(list(self)):
+            print("\t", el)
+
+    def __iter__(self):
+        entries = [entry for bucket in self._buckets.values() for entry in bucket]
+        entries.sort(key=lambda entry: entry[0])
+        return iter([expr for _, expr in entries])
+
+    def __len__(self):
+        return self._size
+
+    def __copy__(self):
+        cp = TypedStack()
+        cp._buckets = {key: list(bucket) for key, bucket in self._buckets.items()}
+        cp._next_position = self._next_position
+        cp._size = self._size
+        return cp
+
+    def __repr__(self):
+        return list(self)[::-1].__repr__()
+
+    def __eq__(self, other):
+        if not isinstance(other, TypedStack):
+            return False
+        return list(self) == list(other)
+
+
+class Checkpoint:
+    """Snapshot of the Push interpreter's stacks after processing the first `position` elements of push code."""
+
+    __slots__ = ["position", "dag_stack", "closure_stack"]
+
+    def __init__(self, position: int, dag_stack: TypedStack, closure_stack: PushStack):
+        self.position = position
+        self.dag_stack = dag_stack
+        self.closure_stack = closure_stack
+
+
+def _same_code(a, b) -> bool:
+    if a is b:
+        return True
+    if isinstance(a, PVector) and isinstance(b, PVector):
+        return len(a) == len(b) and all(_same_code(x, y) for x, y in zip(a, b))
+    return False
+
+
+class CompileTrace:
+    """The push code of a compiled program and Checkpoints taken while compiling it.
+
+    Compilation of similar push code, such as the code of a child genome, can resume
+    from the last Checkpoint taken before the first element where the codes differ.
+    Elements are compared by identity, because the genes a child shares with its
+    parent are the same objects.
+    """
+
+    def __init__(self, push_code: Sequence, checkpoints: List[Checkpoint]):
+        self.push_code = push_code
+        self.checkpoints = checkpoints
+
+    def checkpoints_before(self, push_code: Sequence) -> List[Checkpoint]:
+        """Return the Checkpoints that are also valid for `push_code`."""
+        n_same = 0
+        for a, b in zip(self.push_code, push_code):
+            if not _same_code(a, b):
+                break
+            n_same += 1
+        return [cp for cp in self.checkpoints if cp.position <= n_same]
+
+
+_INTERNED_VALUE_TYPES = (int, float, str, bool, type(None))
+
+
+class NodeTable:
+    """Hash-consing table of the expression nodes built by Push.
+
+    A node is identified by its gene and the identities of its children, so
+    structurally identical subtrees built by any Push are the same object. Nodes are
+    shared between programs and must never be modified once they are in the table.
+    Entries are dropped when no program refers to their node any more. The nodes a
+    key refers to by identity are children of the entry's node, so they stay alive
+    as long as the entry does.
+    """
+
+    def __init__(self):
+        self._nodes = WeakValueDictionary()
+
+    @staticmethod
+    def leaf_key(expr: Expression) -> Optional[Hashable]:
+        """The key of a Constant or Input, or None if the leaf should not be shared."""
+        if isinstance(expr, Constant):
+            if type(expr.value) not in _INTERNED_VALUE_TYPES:
+                return None
+            # repr tells apart values which compare equal, like 0.0 and -0.0.
+            return Constant, type(expr.value), repr(expr.value), expr.dtype()
+        return type(expr), expr.symbol, expr.dtype()
+
+    @staticmethod
+    def node_key(expr: Expression, children: Mapping[str, Expression]) -> Hashable:
+        """The key of the node built by adding `children` to the gene `expr`."""
+        child_ids = tuple((nm, id(child)) for nm, child in children.items())
+        if isinstance(expr, FunctionLike):
+            return type(expr), expr.fn, id(getattr(expr, "reifier", None)), child_ids
+        return type(expr), child_ids
+
+    def get(self, key: Hashable) -> Optional[Expression]:
+        return self._nodes.get(key)
+
+    def put(self, key: Hashable, node: Expression) -> Expression:
+        self._nodes[key] = node
+        return node
+
+    def intern_leaf(self, expr: Expression) -> Expression:
+        key = self.leaf_key(expr)
+        if key is None:
+            return expr
+        node = self._nodes.get(key)
+        if node is None:
+            node = self.put(key, expr)
+        return node
+
+    def __len__(self):
+        return len(self._nodes)
+
+
+_node_table = NodeTable()
+
+
+class ClosureCache:
+    """Least recently used cache of the Dags compiled from closures by HOFs.
+
+    The Dag compiled from a closure depends only on the closure's code, the type of
+    the elements of the sequence, the number of arguments and the return type of the
+    function, so the same closures are compiled once. Closures that fail to compile
+    are cached as None. Keys refer to the elements of the code by identity, so each
+    entry keeps the code alive to stop the identities from being reused.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        The maximum number of compiled closures to keep. Default is 10000.
+
+    Attributes
+    ----------
+    max_size : int
+        The maximum number of compiled closures to keep.
+    hits : int
+        Number of lookups that found a compiled closure.
+    misses : int
+        Number of lookups that did not find a compiled closure.
+
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(closure: Closure, el_type: type, n_args: int, ret: type) -> Hashable:
+        return closure.code_key(), el_type, n_args, ret
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional[Dag]]:
+        """Return whether the key is cached, and the Dag compiled from the closure, or None if it failed."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return True, entry[1]
+
+    def put(self, key: Hashable, closure: Closure, dag: Optional[Dag]):
+        self._entries[key] = (closure.func_def, dag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_closure_cache = ClosureCache()
+
+
 class Push:
 
-    def __init__(self, allow_local_args: bool = False):
-        self.dag_stack = PushStack()
+    def __init__(self,
+                 allow_local_args: bool = False,
+                 node_table: NodeTable = None,
+                 closure_cache: ClosureCache = None):
+        self.dag_stack = TypedStack()
         self.closure_stack = PushStack()
         self.allow_local_args = allow_local_args
+        self.node_table = node_table if node_table is not None else _node_table
+        self.closure_cache = closure_cache if closure_cache is not None else _closure_cache
 
-    def _pop_top_valid(self, typ: Type) -> Optional[Expression]:
-        for ndx, el in enumerate(self.dag_stack[::-1]):
-            if is_subtype(el.dtype(), typ) and el.depth < 50:
-                return self.dag_stack.pop(ndx)
-        return None
+    def _pop_top_valid(self, typ: Type, popped: List = None) -> Optional[Expression]:
+        entry = self.dag_stack.pop_top_valid(typ)
+        if entry is None:
+            return None
+        if popped is not None:
+            popped.append(entry)
+        return entry[-1]
 
     def _pop_children(self, signature: Signature, reifier: TypeReifier = None) -> POMap:
-        old_stack = copy(self.dag_stack)
+        popped = []
         children = POMap()
         reified_sig = signature
         for child_name in signature.args.keys():
             typ = reified_sig.args[child_name]
-            child = self._pop_top_valid(typ)
+            child = self._pop_top_valid(typ, popped)
             if child is None:
-                self.dag_stack = old_stack
+                self.dag_stack.restore(popped)
                 return None
             children = children.add(child_name, child)
             if reifier is not None:
@@ -99,18 +352,26 @@ class Push:
                 reified_sig = reifier.reify(reified_sig, child_types)
         return children
 
+    def _compile_closure(self, closure: Closure, el_type: type, n_args: int, ret: type) -> Optional[Dag]:
+        key = self.closure_cache.key(closure, el_type, n_args, ret)
+        found, dag = self.closure_cache.get(key)
+        if found:
+            return dag
+        clean_func_def = []
+        for e in closure.func_def:
+            if isinstance(e, LocalInput):
+                fixed_local_input = LocalInput(e.ndx % n_args, el_type)
+                clean_func_def.append(fixed_local_input)
+            else:
+                clean_func_def.append(e)
+        push = Push(allow_local_args=True, node_table=self.node_table, closure_cache=self.closure_cache)
+        dag = push.compile(clean_func_def, ret)
+        self.closure_cache.put(key, closure, dag)
+        return dag
+
     def _pop_top_valid_closure_as_dag(self, el_type: type, n_args: int, ret: type) -> Optional[Dag]:
         for ndx, closure in enumerate(self.closure_stack[::-1]):
-            clean_func_def = []
-            for e in closure.func_def:
-                if isinstance(e, LocalInput):
-                    fixed_local_input = LocalInput(e.ndx % n_args, el_type)
-                    clean_func_def.append(fixed_local_input)
-                else:
-                    clean_func_def.append(e)
-            # print(">>> IN >>>")
-            dag = Push(allow_local_args=True).compile(clean_func_def, ret)
-            # print("<<< OUT <<<")
+            dag = self._compile_closure(closure, el_type, n_args, ret)
             if dag is not None:
                 self.closure_stack.pop(ndx)
                 return dag
@@ -125,29 +386,31 @@ class Push:
             print("Closure Stack:")
             self.closure_stack.pprint()
         if isinstance(expr, Constant):
-            self.dag_stack.push(expr)
+            self.dag_stack.push(self.node_table.intern_leaf(expr))
         elif isinstance(expr, Input):
             if isinstance(expr, LocalInput):
                 if self.allow_local_args:
-                    self.dag_stack.push(expr)
+                    self.dag_stack.push(self.node_table.intern_leaf(expr))
             else:
-                self.dag_stack.push(expr)
+                self.dag_stack.push(self.node_table.intern_leaf(expr))
         elif isinstance(expr, FunctionLike):
-            expr_copy = copy(expr)
-            reifier = getattr(expr_copy, "reifier", None)
-            children = self._pop_children(expr_copy.base_signature, reifier)
+            reifier = getattr(expr, "reifier", None)
+            children = self._pop_children(expr.base_signature, reifier)
             if children is None:
                 return
-            expr_copy.add_children(children)
-            expr_copy.reify()
-            self.dag_stack.push(expr_copy)
+            key = self.node_table.node_key(expr, children)
+            node = self.node_table.get(key)
+            if node is None:
+                node = copy(expr)
+                node.add_children(children)
+                node.reify()
+                self.node_table.put(key, node)
+            self.dag_stack.push(node)
         elif isinstance(expr, (PVector, List)):
             self.closure_stack.push(Closure(expr))
         elif isinstance(expr, HOF):
-            old_dag_stack = copy(self.dag_stack)
             seq = self._pop_top_valid(List)
             if seq is None:
-                self.dag_stack = old_dag_stack
                 # print("Tried HOF - Got no seq")
                 return
 
@@ -159,17 +422,51 @@ class Push:
                 # print("Tried HOF - Got no closures out of " + str(len(self.closure_stack)))
                 return
 
-            expr.add_child("seq", seq)
-            expr.add_child("func", func_dag.root)
-            expr.reify()
-            self.dag_stack.push(expr)
+            children = {"seq": seq, "func": func_dag.root}
+            key = self.node_table.node_key(expr, children)
+            node = self.node_table.get(key)
+            if node is None:
+                node = copy(expr)
+                node.add_children(children)
+                node.reify()
+                self.node_table.put(key, node)
+            self.dag_stack.push(node)
         else:
             raise ValueError("Found invalid PushCode element: " + str(expr))
 
     def compile(self, push_code: Sequence[Expression], output_type: type, verbose: bool = False) -> Dag:
-        self.dag_stack = PushStack()
+        self.dag_stack = TypedStack()
         for expr in push_code:
             self.process_expr(expr, verbose)
+        return self._finish(output_type, verbose)
+
+    def compile_incremental(self,
+                            push_code: Sequence[Expression],
+                            output_type: type,
+                            parent_trace: CompileTrace = None,
+                            checkpoint_interval: int = 5) -> Tuple[Dag, CompileTrace]:
+        """Compile push code, resuming from the Checkpoints of similar push code if possible.
+
+        Returns the compiled Dag, and a CompileTrace from which the compilation of
+        similar push code can resume.
+        """
+        self.dag_stack = TypedStack()
+        self.closure_stack = PushStack()
+        checkpoints = []
+        start = 0
+        if parent_trace is not None:
+            checkpoints = parent_trace.checkpoints_before(push_code)
+            if len(checkpoints) > 0:
+                start = checkpoints[-1].position
+                self.dag_stack = copy(checkpoints[-1].dag_stack)
+                self.closure_stack = copy(checkpoints[-1].closure_stack)
+        for ndx in range(start, len(push_code)):
+            if ndx > start and ndx % checkpoint_interval == 0:
+                checkpoints.append(Checkpoint(ndx, copy(self.dag_stack), copy(self.closure_stack)))
+            self.process_expr(push_code[ndx])
+        return self._finish(output_type), CompileTrace(push_code, checkpoints)
+
+    def _finish(self, output_type: type, verbose: bool = False) -> Dag:
         if verbose:
             print()
             print("Final DAG Stack:")
@@ -3,9 +3,9 @@ from abc import ABC, abstractmethod
 from typing import Mapping, Sequence, Set, List
 
 from pyrsistent import PRecord, field, pmap_field
-from pytypes import get_Generic_itemtype
 
 from push4.collections import POMap
+from push4.lang.types import get_Generic_itemtype
 
 
 class Signature(PRecord):
@@ -0,0 +1,195 @@
+"""The :mod:`rewrite` module simplifies reified expression trees without changing what they compute.
+
+Subtrees of constants are folded into a single Constant by calling the functions
+themselves. Rules registered for a function (see `register_rule`) rewrite its nodes
+into simpler equivalent expressions, such as `add(t, 0)` into `t`. A rewrite is only
+applied if the replacement has the same reified type as the node it replaces, so
+the types of the rest of the tree are unchanged.
+
+Nodes are shared between programs and are never modified. Rewritten trees are
+built bottom up from new nodes, which are interned in a NodeTable, so equal trees
+are still the same objects.
+"""
+from copy import copy
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from push4.lang.dag import Dag
+from push4.lang.expr import Expression, Constant, Input, FunctionLike
+from push4.lang.push import NodeTable, _node_table
+
+# A rule takes a reified node, whose children are already simplified, and returns an
+# equivalent expression, or None if it does not apply.
+Rule = Callable[[FunctionLike], Optional[Expression]]
+
+_rules: Dict[Callable, List[Rule]] = {}
+_total_functions = set()
+
+# Only values of these types are folded into constants, so folded constants are immutable and can be interned.
+_FOLDED_VALUE_TYPES = (int, float, str, bool)
+
+
+def register_rule(fn: Callable, rule: Rule):
+    """Register a rule which rewrites the nodes of `fn`."""
+    _rules.setdefault(fn, []).append(rule)
+
+
+def register_total(fn: Callable):
+    """Register a pure function which returns a value, instead of raising, for all arguments of its reified types.
+
+    Rules may drop subtrees made only of total functions, because evaluating them has
+    no observable effect.
+    """
+    _total_functions.add(fn)
+
+
+def is_total(expr: Expression) -> bool:
+    """True if evaluating `expr` has no side effects and cannot raise an error."""
+    if isinstance(expr, (Constant, Input)):
+        return True
+    if isinstance(expr, FunctionLike):
+        return expr.fn in _total_functions and all(is_total(child) for child in expr.children.values())
+    return False
+
+
+def _is_constant(expr: Expression, value: Any) -> bool:
+    # Compares types too, so 0 does not match 0.0 or False.
+    return isinstance(expr, Constant) and type(expr.value) is type(value) and expr.value == value
+
+
+def identity(operand: str, constant: str, value: Any, types: Tuple[type, ...]) -> Rule:
+    """Rule which rewrites `fn(operand=t, constant=value)` to `t`, if `t` is of one of the given types."""
+
+    def rule(node: FunctionLike) -> Optional[Expression]:
+        t = node.children[operand]
+        if _is_constant(node.children[constant], value) and t.dtype() in types:
+            return t
+        return None
+
+    return rule
+
+
+def absorbing(operand: str, constant: str, value: Any, types: Tuple[type, ...]) -> Rule:
+    """Rule which rewrites `fn(operand=t, constant=value)` to `value`, if `t` is total and of one of the given types."""
+
+    def rule(node: FunctionLike) -> Optional[Expression]:
+        t = node.children[operand]
+        if _is_constant(node.children[constant], value) and t.dtype() in types and is_total(t):
+            return node.children[constant]
+        return None
+
+    return rule
+
+
+def involution(arg: str, types: Tuple[type, ...]) -> Rule:
+    """Rule which rewrites `fn(fn(t))` to `t`, if `t` is of one of the given types."""
+
+    def rule(node: FunctionLike) -> Optional[Expression]:
+        child = node.children[arg]
+        if isinstance(child, FunctionLike) and child.fn is node.fn:
+            t = child.children[arg]
+            if t.dtype() in types:
+                return t
+        return None
+
+    return rule
+
+
+def idempotent(a: str, b: str) -> Rule:
+    """Rule which rewrites `fn(a=t, b=t)` to `t`, if `t` is pure."""
+
+    def rule(node: FunctionLike) -> Optional[Expression]:
+        if node.children[a] is node.children[b] and node.children[a].is_pure():
+            return node.children[a]
+        return None
+
+    return rule
+
+
+class Simplifier:
+    """Rewrites reified expression trees into simpler equivalent trees.
+
+    Parameters
+    ----------
+    node_table : NodeTable, optional
+        The table that new nodes are interned in. Default is the table shared by all
+        Push interpreters, so simplified programs share nodes with compiled ones.
+
+    Attributes
+    ----------
+    n_folded : int
+        Number of subtrees folded into constants.
+    n_rewritten : int
+        Number of nodes rewritten by rules.
+
+    """
+
+    def __init__(self, node_table: NodeTable = None):
+        self.node_table = node_table if node_table is not None else _node_table
+        self.n_folded = 0
+        self.n_rewritten = 0
+
+    def _rebuild(self, expr: Expression, children: Mapping[str, Expression]) -> Expression:
+        key = self.node_table.node_key(expr, children)
+        node = self.node_table.get(key)
+        if node is None:
+            node = copy(expr)
+            node.add_children(children)
+            node.reify()
+            self.node_table.put(key, node)
+        return node
+
+    def _fold(self, node: FunctionLike) -> Optional[Expression]:
+        if getattr(node.fn, "impure", False):
+            return None
+        if not all(isinstance(child, Constant) for child in node.children.values()):
+            return None
+        try:
+            value = node.fn(**{nm: child.eval() for nm, child in node.children.items()})
+        except Exception:
+            # The error is raised when the program is evaluated.
+            return None
+        if type(value) not in _FOLDED_VALUE_TYPES:
+            return None
+        return self.node_table.intern_leaf(Constant(value, node.dtype()))
+
+    def _rewrite(self, node: Expression) -> Expression:
+        if not isinstance(node, FunctionLike):
+            return node
+        folded = self._fold(node)
+        if folded is not None:
+            self.n_folded += 1
+            return folded
+        for rule in _rules.get(node.fn, []):
+            replacement = rule(node)
+            if replacement is not None and replacement.dtype() == node.dtype():
+                self.n_rewritten += 1
+                return replacement
+        return node
+
+    def simplify(self, root: Expression) -> Expression:
+        """Return a tree which computes the same values as `root`, or `root` itself if it cannot be simplified."""
+        simplified = {}
+
+        def visit(expr: Expression) -> Expression:
+            if id(expr) not in simplified:
+                children = {nm: visit(child) for nm, child in expr.children.items()}
+                node = expr
+                if any(children[nm] is not child for nm, child in expr.children.items()):
+                    node = self._rebuild(expr, children)
+                simplified[id(expr)] = self._rewrite(node)
+            return simplified[id(expr)]
+
+        return visit(root)
+
+    def simplify_dag(self, dag: Optional[Dag]) -> Optional[Dag]:
+        """Return a simplified Dag, or `dag` itself if it cannot be simplified."""
+        if dag is None:
+            return None
+        root = self.simplify(dag.root)
+        if root is dag.root:
+            return dag
+        return Dag(root, dag.compiled)
+
+
+def simplify_dag(dag: Optional[Dag]) -> Optional[Dag]:
+    return Simplifier().simplify_dag(dag)
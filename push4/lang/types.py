@@ -0,0 +1,54 @@
+"""Memoized versions of the `pytypes` functions used to type check expressions.
+
+Compiling push code checks the same few pairs of types against each other many
+times, and `pytypes` is slow. Types are used as cache keys as they are. The
+`typing` module already makes equal generics equal and hash alike, for example
+two separately built `List[int]`, or `Union[int, str]` and `Union[str, int]`.
+Types which cannot be hashed are checked without the cache.
+"""
+from functools import lru_cache
+
+import pytypes
+
+
+@lru_cache(maxsize=4096)
+def _cached_is_subtype(subclass: type, superclass: type) -> bool:
+    return pytypes.is_subtype(subclass, superclass)
+
+
+@lru_cache(maxsize=1024)
+def _cached_get_Generic_itemtype(sq: type):
+    return pytypes.get_Generic_itemtype(sq)
+
+
+def is_subtype(subclass: type, superclass: type) -> bool:
+    """Memoized `pytypes.is_subtype`."""
+    try:
+        return _cached_is_subtype(subclass, superclass)
+    except TypeError as e:
+        if "unhashable" not in str(e):
+            raise
+        return pytypes.is_subtype(subclass, superclass)
+
+
+def get_Generic_itemtype(sq: type):
+    """Memoized `pytypes.get_Generic_itemtype`."""
+    try:
+        return _cached_get_Generic_itemtype(sq)
+    except TypeError as e:
+        if "unhashable" not in str(e):
+            raise
+        return pytypes.get_Generic_itemtype(sq)
+
+
+def cache_info():
+    """Statistics of the `is_subtype` and `get_Generic_itemtype` caches."""
+    return {
+        "is_subtype": _cached_is_subtype.cache_info(),
+        "get_Generic_itemtype": _cached_get_Generic_itemtype.cache_info(),
+    }
+
+
+def cache_clear():
+    _cached_is_subtype.cache_clear()
+    _cached_get_Generic_itemtype.cache_clear()
@@ -1,23 +1,28 @@
 from typing import Any
 
+from push4.lang.expr import impure
 from push4.lang.reify import PassThroughReifier
 
 
+@impure
 def print_tap(to_do: Any) -> Any:
     print(to_do, end="")
     return to_do
 
 
+@impure
 def println_tap(to_do: Any) -> Any:
     print(to_do)
     return to_do
 
 
+@impure
 def print_do(to_print: Any, to_do: Any) -> Any:
     print(to_print, end="")
     return to_do
 
 
+@impure
 def do_print(to_do: Any, to_print: Any) -> Any:
     print(to_print, end="")
     return to_do
@@ -1,7 +1,11 @@
 import operator as op
 from typing import Union, Any, Sequence, Collection, List
 
+import numpy as np
+
+from push4.lang.batch import register_kernel
 from push4.lang.reify import PassThroughReifier, MaxTypeReifier, RetToElementType, ArgsToSame
+from push4.lang.rewrite import register_rule, register_total, identity, absorbing, involution, idempotent
 
 Numeric = Union[int, float]
 Comparable = Union[Numeric, str]
@@ -119,6 +123,144 @@ def sum_(coll: List[Numeric]) -> Numeric:
     return sum(coll)
 
 
+# Vectorized Kernels **********************************************************#
+# Used by batch evaluation. Inputs are arrays of int64, float64 or bool. A kernel
+# returns None when NumPy would not produce exactly what the function above returns.
+
+
+def _numeric(*arrays: np.ndarray) -> bool:
+    return all(a.dtype.kind in "if" for a in arrays)
+
+
+def _comparison_kernel(ufunc):
+    def kernel(a: np.ndarray, b: np.ndarray):
+        if _numeric(a, b):
+            return ufunc(a, b)
+    return kernel
+
+
+def _equality_kernel(ufunc):
+    def kernel(a: np.ndarray, b: np.ndarray):
+        return ufunc(a, b)
+    return kernel
+
+
+def _logical_kernel(ufunc):
+    def kernel(a: np.ndarray, b: np.ndarray):
+        if a.dtype.kind == "b" and b.dtype.kind == "b":
+            return ufunc(a, b)
+    return kernel
+
+
+def _unary_kernel(ufunc):
+    def kernel(a: np.ndarray):
+        if _numeric(a):
+            return ufunc(a)
+    return kernel
+
+
+def _binary_kernel(ufunc):
+    def kernel(a: np.ndarray, b: np.ndarray):
+        if _numeric(a, b):
+            return ufunc(a, b)
+    return kernel
+
+
+def _zero_guarded_kernel(ufunc):
+    # Division by zero returns the float 0.0, so a zero between two ints would mix result types.
+    def kernel(a: np.ndarray, b: np.ndarray):
+        if not _numeric(a, b):
+            return None
+        is_zero = b == 0
+        if is_zero.any():
+            if a.dtype.kind == "i" and b.dtype.kind == "i":
+                return None
+            return np.where(is_zero, 0.0, ufunc(a, b))
+        return ufunc(a, b)
+    return kernel
+
+
+def _not_kernel(a: np.ndarray):
+    return np.logical_not(a)
+
+
+def _div_kernel(a: np.ndarray, b: np.ndarray):
+    if _numeric(a, b):
+        return np.where(b == 0, 0.0, np.true_divide(a, b))
+
+
+def _min_kernel(a: np.ndarray, b: np.ndarray):
+    # `min` returns its first argument unless the second is smaller, even for NaN.
+    if _numeric(a, b) and a.dtype == b.dtype:
+        return np.where(b < a, b, a)
+
+
+def _max_kernel(a: np.ndarray, b: np.ndarray):
+    if _numeric(a, b) and a.dtype == b.dtype:
+        return np.where(b > a, b, a)
+
+
+register_kernel(lt, _comparison_kernel(np.less))
+register_kernel(le, _comparison_kernel(np.less_equal))
+register_kernel(eq, _equality_kernel(np.equal))
+register_kernel(ne, _equality_kernel(np.not_equal))
+register_kernel(ge, _comparison_kernel(np.greater_equal))
+register_kernel(gt, _comparison_kernel(np.greater))
+register_kernel(not_, _not_kernel)
+register_kernel(and_, _logical_kernel(np.logical_and))
+register_kernel(or_, _logical_kernel(np.logical_or))
+register_kernel(abs_, _unary_kernel(np.abs))
+register_kernel(add, _binary_kernel(np.add))
+register_kernel(floordiv, _zero_guarded_kernel(np.floor_divide))
+register_kernel(mod, _zero_guarded_kernel(np.mod))
+register_kernel(mul, _binary_kernel(np.multiply))
+register_kernel(neg, _unary_kernel(np.negative))
+register_kernel(pos, _unary_kernel(np.positive))
+register_kernel(sub, _binary_kernel(np.subtract))
+register_kernel(div, _div_kernel)
+register_kernel(min_, _min_kernel)
+register_kernel(max_, _max_kernel)
+
+
+# Rewrite Rules ***************************************************************#
+# Used by simplification. An identity is only applied to operands of the types for
+# which it holds exactly. For example `t + 0` is not `t` for the float -0.0. The
+# reified type of a node is not always the type of its value, since a node reified by
+# `_max_numeric` as float may return an int. So `t / 1` is not rewritten to `t`.
+
+register_total(not_)
+register_total(and_)
+register_total(or_)
+register_total(abs_)
+register_total(add)
+register_total(mul)
+register_total(neg)
+register_total(pos)
+register_total(sub)
+register_total(min_)
+register_total(max_)
+
+register_rule(add, identity("a", "b", 0, (int,)))
+register_rule(add, identity("b", "a", 0, (int,)))
+register_rule(sub, identity("a", "b", 0, (int, float)))
+register_rule(mul, identity("a", "b", 1, (int, float)))
+register_rule(mul, identity("b", "a", 1, (int, float)))
+register_rule(mul, absorbing("a", "b", 0, (int,)))
+register_rule(mul, absorbing("b", "a", 0, (int,)))
+register_rule(and_, identity("a", "b", True, (bool,)))
+register_rule(and_, identity("b", "a", True, (bool,)))
+register_rule(and_, absorbing("a", "b", False, (bool,)))
+register_rule(and_, absorbing("b", "a", False, (bool,)))
+register_rule(or_, identity("a", "b", False, (bool,)))
+register_rule(or_, identity("b", "a", False, (bool,)))
+register_rule(or_, absorbing("a", "b", True, (bool,)))
+register_rule(or_, absorbing("b", "a", True, (bool,)))
+register_rule(not_, involution("a", (bool,)))
+register_rule(neg, involution("a", (int, float)))
+register_rule(min_, idempotent("a", "b"))
+register_rule(max_, idempotent("a", "b"))
+
+
 # Export *********************************************************#
 
 
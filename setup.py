@@ -5,7 +5,7 @@ setup(
     version="0.0.2",
     author="Eddie Pantridge",
     description="A Genetic Programming system that accretes programs from a stack of expressions and type reification",
-    packages=find_packages(exclude=["tests", "examples", "pytypes"]),
+    packages=find_packages(exclude=["tests", "examples", "benchmarks", "pytypes"]),
     install_requires=[
         "numpy==1.18.1",
         "pandas==0.25.3",
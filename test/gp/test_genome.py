@@ -0,0 +1,90 @@
+import pickle
+
+import numpy as np
+import pytest
+from pyrsistent import pvector
+
+from push4.gp.genome import CompactGenome, erc_code, flatten_compact, unflatten_compact
+from push4.gp.individual import Individual
+from push4.gp.soup import CoreSoup, GeneToken, Soup
+from push4.gp.spawn import Spawner
+from push4.gp.variation import Alternation, size_neutral_umad
+from push4.lang.expr import Constant, Input
+
+
+def soup() -> Soup:
+    return Soup().register_input("x", int).register_constant(1).register_erc_generator(lambda: 7)
+
+
+class TestCompactGenome:
+
+    def test_encode_decode(self):
+        units = soup().units
+        seven = Constant(7)
+        genome = pvector([units[2], GeneToken.OPEN, seven, units[3], GeneToken.CLOSE, Constant(8)])
+        compact = CompactGenome.encode(genome, units)
+        assert compact.codes.dtype == np.uint16
+        assert compact.codes.tolist() == [2, 0, erc_code(np.uint16), 3, 1, erc_code(np.uint16)]
+        assert compact.constants == (seven, Constant(8))
+        assert compact.decode(units) == genome
+
+    def test_encode_unknown_gene(self):
+        with pytest.raises(ValueError):
+            CompactGenome.encode([Input("y", int)], soup().units)
+
+    def test_flatten(self):
+        units = soup().units
+        genomes = [
+            CompactGenome.encode([Constant(5), units[2], Constant(6)], units),
+            CompactGenome.encode([], units),
+            CompactGenome.encode([units[3], Constant(7)], units),
+        ]
+        codes, starts, constants = flatten_compact(genomes)
+        assert starts.tolist() == [0, 3, 3, 5]
+        assert constants == [Constant(5), Constant(6), Constant(7)]
+        assert unflatten_compact(codes, starts, constants) == genomes
+        # Genes are moved with their constants, and unused constants are dropped.
+        moved = unflatten_compact(codes[[4, 1, 0]], np.array([0, 2, 3]), constants)
+        assert [g.decode(units) for g in moved] == [pvector([Constant(7), units[2]]), pvector([Constant(5)])]
+        assert moved[0].constants == (Constant(7),)
+
+    def test_spawn(self):
+        spawner = Spawner(soup(), compact=True)
+        genome = spawner.spawn_genome(50, 50)
+        assert isinstance(genome, CompactGenome)
+        genes = genome.decode(spawner.soup.units)
+        assert len(genes) == 50
+        assert sum(g == Constant(7) for g in genes) == len(genome.constants) > 0
+
+    def test_smaller_pickle(self):
+        spawner = Spawner(CoreSoup())
+        genome = spawner.spawn_genome(100, 100)
+        compact = CompactGenome.encode(genome, spawner.soup.units)
+        assert len(pickle.dumps(compact)) * 5 < len(pickle.dumps(genome))
+
+    def test_individual(self):
+        units = soup().units
+        genome = [units[2], units[3], Constant(4)]
+        ind = Individual(CompactGenome.encode(genome, units), int, units=units)
+        assert ind.program == Individual(genome, int).program
+        assert ind.program.eval(x=3) == 4
+
+
+class TestCompactVariation:
+
+    def test_umad(self):
+        np.random.seed(0)
+        spawner = Spawner(soup(), compact=True)
+        parents = [spawner.spawn_genome(20, 40) for _ in range(50)]
+        children = size_neutral_umad.produce_batch([[p] for p in parents], spawner)
+        assert all(isinstance(c, CompactGenome) for c in children)
+        for child in children:
+            genes = child.decode(spawner.soup.units)
+            assert sum(g == Constant(7) for g in genes) == len(child.constants)
+
+    def test_alternation(self):
+        units = soup().units
+        gn1 = CompactGenome.encode([units[2], Constant(5)], units)
+        gn2 = CompactGenome.encode([Constant(6), units[3]], units)
+        child = Alternation(alternation_rate=0.0).produce([gn1, gn2], Spawner(soup(), compact=True))
+        assert child in (gn1, gn2)
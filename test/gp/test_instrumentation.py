@@ -0,0 +1,89 @@
+import json
+
+import numpy as np
+
+from push4.gp.evolution import GeneticAlgorithm
+from push4.gp.instrumentation import Instrumentation, MemorySink, JsonlSink, TableSink, NO_INSTRUMENTATION
+from push4.gp.population import FitnessCache
+from push4.gp.selection import Lexicase
+from push4.gp.soup import CoreSoup
+from push4.gp.spawn import Spawner
+from push4.gp.variation import size_neutral_umad
+from push4.lang.dag import Dag
+
+
+def error(program: Dag) -> np.array:
+    if program is None:
+        return np.full(4, 1e5)
+    try:
+        return np.array([abs(program.eval(i=i) - 2 * i) for i in range(4)], dtype=float)
+    except Exception:
+        return np.full(4, 1e5)
+
+
+class TestInstrumentation:
+
+    def test_record(self):
+        sink = MemorySink()
+        inst = Instrumentation([sink])
+        with inst.phase("a"):
+            pass
+        with inst.phase("a"):
+            pass
+        inst.count("n")
+        inst.count("n", 2)
+        inst.record("x", 1.5)
+        inst.end_generation(1)
+        inst.end_generation(2)
+        first, second = sink.records
+        assert list(first.keys()) == ["generation", "a_wall", "a_cpu", "n", "x"]
+        assert first["a_wall"] >= 0 and first["n"] == 3 and first["x"] == 1.5
+        assert second == {"generation": 2}
+
+    def test_null(self):
+        assert not NO_INSTRUMENTATION.enabled
+        with NO_INSTRUMENTATION.phase("a"):
+            NO_INSTRUMENTATION.count("n")
+        NO_INSTRUMENTATION.end_generation(1)
+        assert NO_INSTRUMENTATION.sinks == []
+
+    def test_jsonl_sink(self, tmp_path):
+        path = str(tmp_path / "gens.jsonl")
+        inst = Instrumentation([JsonlSink(path)])
+        inst.record("mean", np.float64(0.5))
+        inst.end_generation(1)
+        inst.end_generation(2)
+        inst.close()
+        with open(path) as f:
+            assert [json.loads(line) for line in f] == [{"generation": 1, "mean": 0.5}, {"generation": 2}]
+
+    def test_table_sink(self, capsys):
+        sink = TableSink()
+        sink.write({"generation": 1, "x": 0.123456, "y": None})
+        sink.write({"generation": 2, "x": 2.0})
+        assert capsys.readouterr().out.splitlines() == ["generation\tx\ty", "1\t0.1235\t-", "2\t2\t-"]
+
+    def test_evolver(self):
+        sink = MemorySink()
+        evo = GeneticAlgorithm(
+            error_function=error,
+            spawner=Spawner(CoreSoup().register_input("i", int)),
+            selector=Lexicase(epsilon=False),
+            variation=size_neutral_umad,
+            population_size=20,
+            max_generations=3,
+            initial_genome_size=(5, 20),
+            fitness_cache=FitnessCache(),
+            instrumentation=Instrumentation([sink]),
+        )
+        evo.run(int)
+        assert 1 <= len(sink.records) <= 3
+        assert [r["generation"] for r in sink.records] == list(range(1, len(sink.records) + 1))
+        for record in sink.records:
+            for phase in ["generation", "decode", "compile", "evaluate"]:
+                assert record[phase + "_wall"] >= 0 and record[phase + "_cpu"] >= 0
+            assert record["n_individuals"] == 20
+            assert record["cache_hits"] + record["cache_misses"] <= 20
+            assert record["mean_program_size"] is None or record["mean_program_size"] >= 1
+        for record in sink.records[:-1]:
+            assert "selection_wall" in record and "variation_wall" in record
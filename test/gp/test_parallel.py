@@ -0,0 +1,39 @@
+import numpy as np
+
+from push4.gp.individual import Individual
+from push4.gp.parallel import ParallelContext
+from push4.gp.population import Population, FitnessCache
+from push4.lang.dag import Dag
+from push4.lang.expr import Constant, Input
+
+
+def error(program: Dag) -> np.array:
+    if program is None:
+        return np.array([100.0])
+    return np.array([abs(program.eval(x=3) - 5)])
+
+
+class TestParallelContext:
+
+    def test_evaluate(self):
+        genomes = [[Constant(1)], [Input("x", int)], [Constant("a")], [Constant(5)]]
+        with ParallelContext(n_proc=2, chunksize=1).start(error, int) as ctx:
+            errors = ctx.evaluate(genomes)
+        assert [e.tolist() for e in errors] == [[4], [2], [100.0], [0]]
+
+    def test_p_evaluate(self):
+        pop = Population([Individual([Constant(v)], int) for v in [1, 9, 5, 6]])
+        with ParallelContext(n_proc=2).start(error, int) as ctx:
+            pop.p_evaluate(ctx)
+        assert [i.total_error for i in pop] == [0, 1, 4, 4]
+        assert len(pop.unevaluated) == 0
+
+    def test_p_evaluate_with_cache(self):
+        cache = FitnessCache()
+        cache.put(FitnessCache.key(None), np.array([100.0]))
+        pop = Population([Individual(g, int) for g in [[Constant(1)], [Constant(1)], [Constant("a")], [Constant(5)]]])
+        with ParallelContext(n_proc=2).start(error, int) as ctx:
+            pop.p_evaluate(ctx, cache)
+        assert [i.total_error for i in pop] == [0, 4, 4, 100.0]
+        assert (cache.hits, cache.misses) == (2, 2)
+        assert len(cache) == 3
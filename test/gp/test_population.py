@@ -0,0 +1,134 @@
+from copy import copy
+
+import numpy as np
+
+from push4.gp.individual import Individual
+from push4.gp.population import Population, FitnessCache
+from push4.lang.dag import Dag
+from push4.lang.expr import Constant, Input, Function
+from push4.library.op import add, _max_numeric
+
+
+def error(program: Dag) -> np.array:
+    if program is None:
+        return np.array([100.0])
+    return np.array([abs(program.eval(x=3) - 5)])
+
+
+class TestFitnessCache:
+
+    def test_lru(self):
+        cache = FitnessCache(max_size=2)
+        cache.put("a", np.array([1]))
+        cache.put("b", np.array([2]))
+        assert cache.get("a") is not None
+        cache.put("c", np.array([3]))
+        assert cache.get("b") is None
+        assert cache.get("a").tolist() == [1]
+        assert cache.get("c").tolist() == [3]
+        assert (cache.hits, cache.misses) == (3, 1)
+        assert len(cache) == 2
+
+    def test_key(self):
+        x_plus_1 = Function(add, _max_numeric).add_children({"a": Input("x", int), "b": Constant(1)})
+        x_plus_true = Function(add, _max_numeric).add_children({"a": Input("x", int), "b": Constant(True)})
+        assert FitnessCache.key(Dag(x_plus_1)) == FitnessCache.key(Dag(x_plus_1))
+        assert FitnessCache.key(Dag(x_plus_1)) != FitnessCache.key(Dag(x_plus_true))
+        assert FitnessCache.key(None) is None
+
+
+class TestPopulation:
+
+    def test_evaluate_with_cache(self):
+        calls = []
+
+        def counting_error(program: Dag) -> np.array:
+            calls.append(program)
+            return error(program)
+
+        cache = FitnessCache()
+        pop = Population([
+            Individual([Constant(1)], int),
+            Individual([Constant(9)], int),
+            Individual([Constant(1), Constant(9)], int),
+            Individual([Constant("a")], int),
+            Individual([Constant("b")], int),
+        ])
+        pop.evaluate(counting_error, cache)
+        assert len(calls) == 3
+        assert (cache.hits, cache.misses) == (2, 3)
+        assert [i.total_error for i in pop] == [4, 4, 4, 100.0, 100.0]
+
+    def test_unique_error_vectors(self):
+        pop = Population([Individual([Constant(v)], int) for v in [1, 9, 5, 1]])
+        pop.evaluate(error)
+        errors, groups = pop.unique_error_vectors()
+        assert errors.tolist() == [[0], [4]]
+        assert [g.tolist() for g in groups] == [[0], [1, 2, 3]]
+        assert pop.unique_error_vectors()[0] is errors
+
+    def test_evaluate_on_cases(self):
+        def error_on_cases(program: Dag, cases=None) -> np.array:
+            xs = np.array([0, 1, 2, 3])
+            if cases is not None:
+                xs = xs[cases]
+            return np.abs(program.eval() - xs)
+
+        cache = FitnessCache()
+        pop = Population([Individual([Constant(1)], int), Individual([Constant(1)], int)])
+        pop.evaluate(error_on_cases, cache, cases=np.array([0, 3]))
+        assert [i.error_vector.tolist() for i in pop] == [[1, 2], [1, 2]]
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert cache.get(FitnessCache.key(pop[0].program)) is None
+
+    def test_sorted_arrays(self):
+        pop = Population([Individual([Constant(v)], int) for v in [1, 9, 5, 6, 4]])
+        pop.evaluate(error)
+        assert pop.all_total_errors().tolist() == [0, 1, 1, 4, 4]
+        assert pop.all_error_vectors().tolist() == [[0], [1], [1], [4], [4]]
+        assert [i.total_error for i in pop] == [0, 1, 1, 4, 4]
+        late = Individual([Constant(2)], int)
+        late.error_vector = np.array([3])
+        pop.add(late)
+        assert pop.all_total_errors().tolist() == [0, 1, 1, 3, 4, 4]
+        assert pop[3] is late
+
+    def test_copy(self):
+        pop = Population([Individual([Constant(v)], int) for v in [9, 1]])
+        pop.evaluate(error)
+        cp = copy(pop)
+        late = Individual([Constant(5)], int)
+        late.error_vector = np.array([0])
+        cp.add(late)
+        assert len(pop) == 2 and len(cp) == 3
+        assert pop.all_total_errors().tolist() == [4, 4]
+        assert cp.all_total_errors().tolist() == [0, 4, 4]
+
+    def test_reuse_parent_errors(self):
+        calls = []
+
+        def counting_error(program: Dag, cases=None) -> np.array:
+            calls.append(program)
+            return error(program)
+
+        parents = Population([Individual([Constant(v), Constant(2)], int) for v in [1, 3]])
+        parents.evaluate(counting_error)
+        parent = parents[0]
+        same_genome = Individual(parent.genome, int).inherit(parent)
+        same_program = Individual([Constant(7), Constant(2)], int).inherit(parent)
+        other_program = Individual([Constant(2), Constant(4)], int).inherit(parent)
+        assert same_genome.program is parent.program
+        calls.clear()
+        Population([same_genome, same_program, other_program]).evaluate(counting_error)
+        assert calls == [other_program.program]
+        assert same_genome.error_vector is parent.error_vector
+        assert same_program.error_vector is parent.error_vector
+
+    def test_reuse_parent_errors_on_same_cases(self):
+        parent = Individual([Constant(1)], int)
+        Population([parent]).evaluate(lambda program, cases=None: error(program), cases=np.array([0]))
+        assert parent.error_cases.tolist() == [0]
+        child = Individual(parent.genome, int).inherit(parent)
+        assert not child.reuse_parent_errors(cases=None)
+        child = Individual(parent.genome, int).inherit(parent)
+        assert child.reuse_parent_errors(cases=np.array([0]))
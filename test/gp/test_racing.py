@@ -0,0 +1,78 @@
+import numpy as np
+
+from push4.gp.evolution import GeneticAlgorithm
+from push4.gp.individual import Individual
+from push4.gp.population import Population, FitnessCache
+from push4.gp.racing import ABORTED, accepts_threshold, n_aborted, race
+from push4.gp.selection import Lexicase
+from push4.gp.soup import CoreSoup
+from push4.gp.spawn import Spawner
+from push4.gp.variation import size_neutral_umad
+from push4.lang.dag import Dag
+from push4.lang.expr import Constant
+
+
+def test_race_without_threshold():
+    assert race(iter([1, 2, 3]), 3, None).tolist() == [1, 2, 3]
+
+
+def test_race_aborts():
+    evaluated = []
+
+    def errors():
+        for e in [1, 5, 2, 7]:
+            evaluated.append(e)
+            yield e
+
+    assert race(errors(), 4, 4.0).tolist() == [1, 5, ABORTED, ABORTED]
+    assert evaluated == [1, 5]
+
+
+def test_race_multiple_errors_per_case():
+    errors = race(iter([(0, 1), (3, 3), (1, 1)]), 3, 2.0)
+    assert errors.tolist() == [0, 1, 3, 3, ABORTED, ABORTED]
+    assert n_aborted(errors) == 2
+
+
+def test_infinite_errors_are_not_aborted():
+    assert n_aborted(np.array([1, np.inf, ABORTED])) == 1
+
+
+def test_race_last_case_is_not_aborted():
+    assert race(iter([1, 9]), 2, 4.0).tolist() == [1, 9]
+
+
+def test_accepts_threshold():
+    assert accepts_threshold(lambda program, threshold=None: None)
+    assert not accepts_threshold(lambda program, cases=None: None)
+
+
+class TestRacingPopulation:
+
+    @staticmethod
+    def error(program: Dag, threshold: float = None) -> np.ndarray:
+        value = program.eval()
+        return race(iter([value] * 4), 4, threshold)
+
+    def test_evaluate_with_threshold(self):
+        cache = FitnessCache()
+        pop = Population([Individual([Constant(v)], int) for v in [1, 3]])
+        pop.evaluate(self.error, cache, threshold=5.0)
+        assert [i.error_vector.tolist() for i in pop] == [[1, 1, 1, 1], [3, 3, ABORTED, ABORTED]]
+        assert pop.n_aborted_errors == 2
+        assert len(cache) == 1
+
+    def test_racing_threshold(self):
+        evo = GeneticAlgorithm(
+            error_function=lambda program, threshold=None: race(iter([1.0] * 4), 4, threshold),
+            spawner=Spawner(CoreSoup().register_input("i", int)),
+            selector=Lexicase(epsilon=False),
+            variation=size_neutral_umad,
+            population_size=10,
+            max_generations=2,
+            initial_genome_size=(5, 10),
+            racing_threshold=lambda totals: 2 * totals.max(),
+        )
+        assert evo.racing
+        evo.run(int)
+        assert evo.error_threshold == 8.0
@@ -4,7 +4,9 @@ import numpy as np
 
 from push4.gp.individual import Individual
 from push4.gp.population import Population
-from push4.gp.selection import CaseStream, Lexicase, one_individual_per_error_vector
+from push4.gp.racing import ABORTED
+from push4.gp.selection import Selector, CaseStream, Lexicase, DownsampledLexicase, Tournament, \
+    FitnessProportionate, Elite, one_individual_per_error_vector
 
 
 class MockIndividual(Individual):
@@ -93,3 +95,91 @@ class TestLexicase:
             cases = MockCaseStream(3)
             selected = lexicase._select_with_stream(pop, cases)
             assert selected.name == "A"
+
+    def test_epsilon_lexicase_mad_aborted(self):
+        pop = Population([
+            MockIndividual("A", [ABORTED, 0]),
+            MockIndividual("B", [ABORTED, 1]),
+            MockIndividual("C", [0, ABORTED]),
+            MockIndividual("D", [np.inf, np.inf]),
+        ])
+        lexicase = Lexicase(epsilon=True)
+        assert np.isfinite(lexicase._epsilon_from_mad(pop.all_error_vectors())).all()
+        for _ in range(10):
+            assert lexicase._select_with_stream(pop, MockCaseStream(2)).name == "C"
+
+    def test_epsilon_lexicase_mad_infinite(self):
+        pop = Population([
+            MockIndividual("A", [np.inf, 0]),
+            MockIndividual("B", [np.inf, 1]),
+            MockIndividual("C", [0, np.inf]),
+        ])
+        lexicase = Lexicase(epsilon=True)
+        for _ in range(10):
+            assert lexicase._select_with_stream(pop, MockCaseStream(2)).name == "C"
+
+    def test_lexicase_duplicates(self):
+        pop = Population([
+            MockIndividual("A", [0, 1]),
+            MockIndividual("B", [1, 0]),
+            MockIndividual("C", [0, 1]),
+        ])
+        lexicase = Lexicase()
+        names = set(lexicase._select_with_stream(pop, MockCaseStream(2)).name for _ in range(50))
+        assert names == {"A", "C"}
+
+
+def mock_population():
+    return Population([
+        MockIndividual("A", [0, 0, 1]),
+        MockIndividual("B", [0, 1, 0]),
+        MockIndividual("C", [1, 1, 1]),
+        MockIndividual("D", [2, 2, 2]),
+    ])
+
+
+class TestSelectBatch:
+
+    def test_lexicase(self):
+        pop = mock_population()
+        ndxs = Lexicase().select_batch(pop, 100)
+        assert len(ndxs) == 100
+        assert set(pop[i].name for i in ndxs) == {"A", "B"}
+
+    def test_tournament(self):
+        pop = mock_population()
+        ndxs = Tournament(tournament_size=4).select_batch(pop, 10)
+        assert [pop[i].total_error for i in ndxs] == [1] * 10
+        assert set(pop[i].name for i in ndxs) == {"A", "B"}
+        ndxs = Tournament(tournament_size=2).select_batch(pop, 200)
+        assert "D" not in set(pop[i].name for i in ndxs)
+
+    def test_fitness_proportionate(self):
+        assert len(FitnessProportionate().select_batch(mock_population(), 7)) == 7
+
+    def test_elite(self):
+        pop = mock_population()
+        assert list(Elite().select_batch(pop, 6, group_size=2)) == [0, 1, 0, 1, 0, 1]
+        assert pop[0].total_error == 1
+
+    def test_default(self):
+        class ThirdSelector(Selector):
+            def select_one(self, population):
+                return population[2]
+
+        assert list(ThirdSelector().select_batch(mock_population(), 3)) == [2, 2, 2]
+
+
+class TestDownsampledLexicase:
+
+    def test_sample_cases(self):
+        cases = DownsampledLexicase(downsample_rate=0.25).sample_cases(20)
+        assert len(cases) == 5
+        assert list(cases) == sorted(set(cases))
+        assert all(0 <= c < 20 for c in cases)
+
+    def test_sample_at_least_one_case(self):
+        assert len(DownsampledLexicase(downsample_rate=0.01).sample_cases(5)) == 1
+
+    def test_all_cases_by_default(self):
+        assert Lexicase().sample_cases(20) is None
@@ -0,0 +1,45 @@
+from pyrsistent import pvector
+
+from push4.gp.soup import GeneToken, Soup
+from push4.gp.spawn import genome_to_push_code, Spawner
+from push4.lang.expr import Constant
+from push4.lang.reify import MaxTypeReifier
+from push4.library.op import add
+
+OPEN = GeneToken.OPEN
+CLOSE = GeneToken.CLOSE
+
+
+class TestGenomeToPushCode:
+
+    def test_flat(self):
+        assert genome_to_push_code([Constant(1), Constant(2)]) == pvector([Constant(1), Constant(2)])
+
+    def test_empty(self):
+        assert genome_to_push_code([]) == pvector([])
+
+    def test_nested(self):
+        genome = [Constant(1), OPEN, Constant(2), OPEN, Constant(3), CLOSE, Constant(4), CLOSE, Constant(5)]
+        expected = pvector([Constant(1), pvector([Constant(2), pvector([Constant(3)]), Constant(4)]), Constant(5)])
+        assert genome_to_push_code(genome) == expected
+
+    def test_unmatched_close(self):
+        genome = [CLOSE, Constant(1), OPEN, CLOSE, CLOSE, Constant(2)]
+        assert genome_to_push_code(genome) == pvector([Constant(1), pvector([]), Constant(2)])
+
+    def test_unclosed_open(self):
+        genome = [OPEN, Constant(1), OPEN, Constant(2)]
+        assert genome_to_push_code(genome) == pvector([pvector([Constant(1), pvector([Constant(2)])])])
+
+
+class TestSpawner:
+
+    def test_genes_are_shared(self):
+        soup = Soup().register_constant(1).register_function(add, MaxTypeReifier([int, float]))
+        genome = Spawner(soup).spawn_genome_of_size(50)
+        assert all(any(gene is unit for unit in soup.units) for gene in genome)
+
+    def test_weighted_units(self):
+        soup = Soup().register_unit(Constant(1), 0.0).register_unit(Constant(2), 1000000)
+        genome = Spawner(soup).spawn_genome_of_size(20)
+        assert all(gene == Constant(2) for gene in genome)
@@ -0,0 +1,97 @@
+import numpy as np
+from pyrsistent import pvector
+
+from push4.gp.soup import Soup
+from push4.gp.spawn import Spawner
+from push4.gp.variation import (
+    AdditionMutation, Alternation, Cloning, DeletionMutation, VariationPipeline, VariationSet,
+    addition_kernel, deletion_kernel, _FlatGenomes, _object_array
+)
+from push4.lang.expr import Constant
+
+NEW = Constant("new")
+
+
+class ConstantSpawner(Spawner):
+
+    def __init__(self):
+        super().__init__(Soup())
+
+    def spawn_genes(self, n: int):
+        return [NEW] * n
+
+
+def spawner() -> Spawner:
+    return ConstantSpawner()
+
+
+def genomes():
+    return [pvector([Constant(1), Constant(2)]), pvector([]), pvector([Constant(3)])]
+
+
+def spawn_new(n: int):
+    return _object_array([NEW] * n)
+
+
+def flatten(genomes):
+    flat = _FlatGenomes(genomes)
+    return flat.genes, flat.starts
+
+
+def unflatten(genes, starts):
+    flat = _FlatGenomes([])
+    flat.genes, flat.starts = genes, starts
+    return flat.genomes()
+
+
+class TestKernels:
+
+    def testflatten(self):
+        genes, starts = flatten(genomes())
+        assert starts.tolist() == [0, 2, 2, 3]
+        assert unflatten(genes, starts) == genomes()
+
+    def test_deletion(self):
+        genes, starts = flatten(genomes())
+        assert unflatten(*deletion_kernel(genes, starts, 0.0)) == genomes()
+        assert unflatten(*deletion_kernel(genes, starts, 1.0)) == [pvector([])] * 3
+
+    def test_addition(self):
+        genes, starts = flatten(genomes())
+        assert unflatten(*addition_kernel(genes, starts, 0.0, spawn_new)) == genomes()
+        assert unflatten(*addition_kernel(genes, starts, 1.0, spawn_new)) == [
+            pvector([NEW, Constant(1), NEW, Constant(2), NEW]),
+            pvector([NEW]),
+            pvector([NEW, Constant(3), NEW]),
+        ]
+
+    def test_rates(self):
+        np.random.seed(0)
+        genes, starts = flatten([pvector([Constant(i) for i in range(100)])] * 100)
+        kept, kept_starts = deletion_kernel(genes, starts, 0.25)
+        assert abs(len(kept) / len(genes) - 0.75) < 0.02
+        assert (np.diff(kept_starts) < 100).all()
+        added, added_starts = addition_kernel(genes, starts, 0.25, spawn_new)
+        assert abs((len(added) - len(genes)) / (len(genes) + 100) - 0.25) < 0.02
+        assert [g for g in added if g != NEW] == genes.tolist()
+
+
+class TestProduceBatch:
+
+    def test_pipeline(self):
+        pipeline = VariationPipeline([AdditionMutation(1.0), DeletionMutation(0.0), AdditionMutation(0.0)])
+        children = pipeline.produce_batch([[g] for g in genomes()], spawner())
+        assert children == [pipeline.produce([g], spawner()) for g in genomes()]
+
+    def test_pipeline_with_alternation(self):
+        pipeline = VariationPipeline([Alternation(0.0, 1.0), DeletionMutation(1.0)])
+        children = pipeline.produce_batch([[g, g] for g in genomes()], spawner())
+        assert children == [pvector([])] * 3
+
+    def test_set_keeps_order(self):
+        variation = VariationSet([(Cloning(), 0.5), (DeletionMutation(1.0), 0.5)])
+        parents = [[pvector([Constant(i)])] for i in range(50)]
+        children = variation.produce_batch(parents, spawner())
+        assert len(children) == 50
+        assert all(child in (pvector([]), p[0]) for child, p in zip(children, parents))
+        assert 0 < children.count(pvector([])) < 50
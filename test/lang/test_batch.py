@@ -0,0 +1,78 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from push4.lang.batch import eval_batch
+from push4.lang.dag import Dag
+from push4.lang.expr import Constant, Input, Function
+from push4.lang.hof import LocalInput, MapExpr, FilterExpr
+from push4.library.io import print_do, _pass_do
+from push4.library.op import add, div, floordiv, gt, _max_numeric, _b_same_as_a
+from push4.library.str import getitem
+
+
+def fn_of(fn, reifier=None, **children):
+    expr = Function(fn, reifier).add_children(children)
+    expr.reify()
+    return expr
+
+
+class TestEvalBatch:
+
+    def test_numeric(self, simple_dag):
+        outputs, failed = simple_dag.eval_batch({"x": [0.5, -5.0, 1.0]})
+        assert outputs == [5.5, 0.0, 6.0]
+        assert all(type(o) == float for o in outputs)
+        assert not failed.any()
+
+    def test_numpy_columns(self):
+        dag = Dag(fn_of(floordiv, a=Input("a", int), b=Input("b", int)))
+        outputs, failed = dag.eval_batch({"a": np.array([7, -7, 7]), "b": np.array([2, 2, 0])})
+        assert outputs == [3, -4, 0.0]
+        assert [type(o) for o in outputs] == [int, int, float]
+
+    def test_div_by_zero(self):
+        dag = Dag(fn_of(div, a=Input("a", float), b=Input("b", float)))
+        outputs, failed = dag.eval_batch({"a": [1.0, 3.0], "b": [0.0, 2.0]})
+        assert outputs == [0.0, 1.5]
+
+    def test_failed_mask(self):
+        dag = Dag(fn_of(getitem, s1=Input("s", str), ndx=Input("i", int)))
+        outputs, failed = dag.eval_batch({"s": ["abc", "", "xy"], "i": [1, 0, 5]})
+        assert outputs == ["b", None, None]
+        assert list(failed) == [False, True, True]
+
+    def test_missing_input(self, simple_dag):
+        outputs, failed, _ = eval_batch(simple_dag.root, {}, n_cases=2)
+        assert outputs == [None, None]
+        assert failed.all()
+
+    def test_hof(self):
+        inc = fn_of(add, _max_numeric, a=LocalInput(0, int), b=Constant(1))
+        mapped = MapExpr().add_children({"seq": Input("l", List[int]), "func": inc})
+        mapped.reify()
+        pos = fn_of(gt, _b_same_as_a, a=LocalInput(0, int), b=Input("t", int))
+        filtered = FilterExpr().add_children({"seq": mapped, "func": pos})
+        filtered.reify()
+        dag = Dag(filtered)
+        columns = {"l": [[1, 2, 3], [], [-5, 5], [1, "a"]], "t": [2, 0, 0, 0]}
+        outputs, failed = dag.eval_batch(columns)
+        assert outputs == [[3, 4], [], [6], None]
+        assert list(failed) == [False, False, False, True]
+
+    def test_stdout(self):
+        dag = Dag(fn_of(print_do, _pass_do, to_print=Input("x", int), to_do=Constant("a")))
+        outputs, failed = dag.eval_batch({"x": [1, 22, 333]})
+        assert outputs == ["a", "a", "a"]
+        assert dag.batch_stdout() == ["1", "22", "333"]
+
+    def test_matches_eval(self, simple_dag):
+        xs = [0.5, -5.0, 1e10, 3.0]
+        outputs, _ = simple_dag.eval_batch({"x": xs})
+        assert outputs == [simple_dag.eval(x=x) for x in xs]
+
+
+@pytest.fixture
+def simple_dag(add_fn, int_constant, input_expr):
+    return Dag(add_fn.add_children({"a": int_constant, "b": input_expr}))
@@ -0,0 +1,141 @@
+import pickle
+from typing import List
+
+import pytest
+
+from push4.gp.soup import GeneToken
+from push4.gp.spawn import genome_to_push_code
+from push4.lang.codegen import CodeGen, compile_expr, compile_hof_body
+from push4.lang.dag import Dag
+from push4.lang.expr import Constant, Input, Function
+from push4.lang.hof import LocalInput, MapExpr, FilterExpr
+from push4.lang.push import Push
+from push4.library.collections import wrap
+from push4.library.io import print_do, _pass_do
+from push4.library.op import add, _max_numeric, gt, _b_same_as_a
+
+
+@pytest.fixture
+def hof_dag() -> Dag:
+    genome = [
+        Input("my_list", List[int]),
+        GeneToken.OPEN,
+        LocalInput(0),
+        Constant(1),
+        Function(add, _max_numeric),
+        GeneToken.CLOSE,
+        MapExpr(),
+        GeneToken.OPEN,
+        Constant(2),
+        LocalInput(0),
+        Function(gt, _b_same_as_a),
+        GeneToken.CLOSE,
+        FilterExpr(),
+    ]
+    return Push().compile(genome_to_push_code(genome), List[int])
+
+
+class TestCodeGen:
+
+    def test_compile_simple(self, add_fn, int_constant, input_expr):
+        root = add_fn.add_children({"a": int_constant, "b": input_expr})
+        root.reify()
+        fn = compile_expr(root)
+        assert fn({"x": 0.5}) == 5.5
+        assert fn({"x": -5.0}) == 0.0
+
+    def test_source(self, add_fn, int_constant, input_expr):
+        root = add_fn.add_children({"a": int_constant, "b": input_expr})
+        root.reify()
+        src = CodeGen("plus_5").source(root)
+        assert src.startswith("def plus_5(_kw):")
+        assert "_kw['x']" in src
+
+    def test_mutable_constant_is_copied(self):
+        root = Function(wrap).add_child("el", Constant([1, 2], List[int]))
+        root.reify()
+        fn = compile_expr(root)
+        first = fn({})
+        first[0].append(3)
+        assert fn({}) == [[1, 2]]
+
+    def test_hof(self, hof_dag):
+        fn = hof_dag.compiled_fn()
+        assert fn({"my_list": [5, 0, 1, -3]}) == [6]
+        assert fn({"my_list": [1, 2, 3]}) == [3, 4]
+        assert fn({"my_list": []}) == []
+
+    def test_hoist_invariants(self):
+        calls = []
+
+        def offset(n: int) -> int:
+            calls.append(n)
+            return n + 1
+
+        inv = Function(offset).add_child("n", Input("n", int))
+        inv.reify()
+        body = Function(add, _max_numeric).add_children({"a": LocalInput(0, int), "b": inv})
+        body.reify()
+        root = MapExpr().add_children({"seq": Input("l", List[int]), "func": body})
+        root.reify()
+        fn = compile_expr(root)
+        assert fn({"l": [1, 2, 3], "n": 10}) == [12, 13, 14]
+        assert calls == [10]
+        assert fn({"l": [], "n": 10}) == []
+        assert calls == [10]
+        inc_by_offset = compile_hof_body(body)({"n": 5})
+        assert [inc_by_offset(el) for el in [1, 2]] == [7, 8]
+        assert calls == [10, 5]
+
+    def test_hof_body(self):
+        body = Function(add, _max_numeric).add_children({"a": LocalInput(0, int), "b": Input("n", int)})
+        body.reify()
+        inc_by_n = compile_hof_body(body)({"n": 10})
+        assert [inc_by_n(el) for el in [1, 2]] == [11, 12]
+
+
+class TestCompiledDag:
+
+    def test_eval_matches_interpreter(self, hof_dag):
+        for my_list in [[5, 0, 1, -3], [1, 2, 3], []]:
+            assert hof_dag.eval(my_list=my_list) == hof_dag.interpret(my_list=my_list)
+
+    def test_error_matches_interpreter(self, hof_dag):
+        with pytest.raises(Exception) as compiled_err:
+            hof_dag.eval(my_list=[1, "a"])
+        with pytest.raises(Exception) as interpreted_err:
+            hof_dag.interpret(my_list=[1, "a"])
+        assert str(compiled_err.value) == str(interpreted_err.value)
+
+    def test_interpreter_compiles_pure_hof_bodies(self, hof_dag):
+        assert hof_dag.interpret(my_list=[1, 2, 3]) == [3, 4]
+        assert hof_dag.root._compiled_body
+        body = Function(print_do, _pass_do).add_children({"to_print": LocalInput(0, int), "to_do": LocalInput(0, int)})
+        dag = Dag(MapExpr().add_children({"seq": Input("l", List[int]), "func": body}))
+        assert dag.interpret(l=[1, 2]) == [1, 2]
+        assert dag.stdout() == "12"
+        assert dag.root._compiled_body is False
+
+    def test_pickle_after_interpret(self, hof_dag):
+        hof_dag.interpret(my_list=[1, 2, 3])
+        assert hof_dag.root._compiled_body
+        copied = pickle.loads(pickle.dumps(hof_dag))
+        assert copied.root._compiled_body is None
+        assert copied.interpret(my_list=[1, 2, 3]) == [3, 4]
+
+    def test_missing_input(self, hof_dag):
+        with pytest.raises(AssertionError):
+            hof_dag.eval()
+
+    def test_stdout(self):
+        root = Function(print_do, _pass_do).add_children({"to_print": Input("x", int), "to_do": Constant("a")})
+        dag = Dag(root)
+        assert dag.eval(x=5) == "a"
+        assert dag.stdout() == "5"
+        assert dag.eval(x=7) == "a"
+        assert dag.stdout() == "7"
+
+    def test_not_compiled(self, add_fn, int_constant, input_expr):
+        dag = Dag(add_fn.add_children({"a": int_constant, "b": input_expr}), compiled=False)
+        assert dag.eval(x=0.5) == 5.5
+        assert dag._compiled_fn is None
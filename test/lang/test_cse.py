@@ -0,0 +1,76 @@
+from push4.lang.codegen import compile_expr
+from push4.lang.cse import value_numbers
+from push4.lang.dag import Dag
+from push4.lang.expr import Constant, Input, Function
+from push4.library.io import print_do, _pass_do
+from push4.library.op import add, _max_numeric
+
+
+def reified(expr):
+    expr.reify()
+    return expr
+
+
+def twice(calls: list):
+    """Return `add(f(x), f(x))` built from two distinct but identical subtrees, where `f` counts its calls."""
+
+    def f(x: int) -> int:
+        calls.append(x)
+        return x * 2
+
+    def f_of_x():
+        return reified(Function(f).add_child("x", Input("x", int)))
+
+    return reified(Function(add, _max_numeric).add_children({"a": f_of_x(), "b": f_of_x()}))
+
+
+def printed():
+    return reified(Function(print_do, _pass_do).add_children({"to_print": Input("x", int), "to_do": Constant(1)}))
+
+
+class TestValueNumbers:
+
+    def test_identical_subtrees(self):
+        root = twice([])
+        numbers = value_numbers(root)
+        a, b = root.children["a"], root.children["b"]
+        assert a is not b
+        assert numbers[id(a)] == numbers[id(b)]
+        assert numbers[id(root)] not in (None, numbers[id(a)])
+
+    def test_distinct_constants(self):
+        one = reified(Function(add, _max_numeric).add_children({"a": Input("x", int), "b": Constant(1)}))
+        true = reified(Function(add, _max_numeric).add_children({"a": Input("x", int), "b": Constant(True)}))
+        root = reified(Function(add, _max_numeric).add_children({"a": one, "b": true}))
+        numbers = value_numbers(root)
+        assert numbers[id(one)] != numbers[id(true)]
+
+    def test_impure(self):
+        printing = printed()
+        root = reified(Function(add, _max_numeric).add_children({"a": printing, "b": Input("x", int)}))
+        numbers = value_numbers(root)
+        assert numbers[id(printing)] is None
+        assert numbers[id(root)] is None
+        assert numbers[id(root.children["b"])] is not None
+
+
+class TestSharedEvaluation:
+
+    def test_compiled(self):
+        calls = []
+        fn = compile_expr(twice(calls))
+        assert fn({"x": 3}) == 12
+        assert calls == [3]
+
+    def test_batch(self):
+        calls = []
+        outputs, failed = Dag(twice(calls)).eval_batch({"x": [1, 2]})
+        assert outputs == [4, 8]
+        assert calls == [1, 2]
+
+    def test_impure_is_not_shared(self):
+        dag = Dag(reified(Function(add, _max_numeric).add_children({"a": printed(), "b": printed()})))
+        assert dag.eval(x=5) == 2
+        assert dag.stdout() == "55"
+        dag.eval_batch({"x": [7]})
+        assert dag.batch_stdout() == ["77"]
@@ -1,11 +1,14 @@
 from copy import copy
-from typing import Union, Any
+from typing import Union, Any, List
 
 import pytest
+from pyrsistent import pvector
 
 from push4.lang.dag import Dag
-from push4.lang.expr import Constant
-from push4.lang.push import PushStack, Push
+from push4.lang.expr import Constant, Input, Function
+from push4.lang.hof import LocalInput, MapExpr
+from push4.lang.push import PushStack, Push, TypedStack, NodeTable, ClosureCache
+from push4.library.op import add, _max_numeric
 
 
 class TestPushStack:
@@ -54,6 +57,30 @@ class TestPushStack:
         assert len(stack) == 0
 
 
+class TestTypedStack:
+
+    def test_pop_top_valid(self):
+        stack = TypedStack().push(Constant(1)).push(Constant("a")).push(Constant(2.5)).push(Constant("b"))
+        assert stack.pop_top_valid(Union[int, float])[-1] == Constant(2.5)
+        assert stack.pop_top_valid(int)[-1] == Constant(1)
+        assert stack.pop_top_valid(list) is None
+        assert list(stack) == [Constant("a"), Constant("b")]
+
+    def test_restore(self):
+        stack = TypedStack().push(Constant(1)).push(Constant("a")).push(Constant(2)).push(Constant("b"))
+        popped = [stack.pop_top_valid(int), stack.pop_top_valid(str), stack.pop_top_valid(int)]
+        assert len(stack) == 1
+        stack.restore(popped)
+        assert list(stack) == [Constant(1), Constant("a"), Constant(2), Constant("b")]
+
+    def test_copy(self):
+        stack = TypedStack().push(Constant(1)).push(Constant("a"))
+        cp = copy(stack)
+        cp.pop_top_valid(int)
+        assert list(stack) == [Constant(1), Constant("a")]
+        assert list(cp) == [Constant("a")]
+
+
 class TestPush:
 
     def test_pop_top_literal_simple_type(self):
@@ -125,3 +152,63 @@ class TestPush:
         assert dag == Dag(expected)
         assert dag.return_type() == float
 
+
+    def test_compile_incremental(self, int_constant, input_expr, add_fn):
+        parent_code = [int_constant, input_expr, add_fn, Constant(2), add_fn, Constant(3)]
+        parent_dag, trace = Push().compile_incremental(parent_code, float, checkpoint_interval=2)
+        assert parent_dag == Push().compile(parent_code, float)
+        assert [cp.position for cp in trace.checkpoints] == [2, 4]
+
+        child_code = parent_code[:5] + [Constant(4), add_fn]
+        assert [cp.position for cp in trace.checkpoints_before(child_code)] == [2, 4]
+        child_dag, child_trace = Push().compile_incremental(child_code, float, trace, checkpoint_interval=2)
+        assert child_dag == Push().compile(child_code, float)
+        assert [cp.position for cp in child_trace.checkpoints] == [2, 4, 6]
+
+    def test_compile_incremental_changed_start(self, int_constant, input_expr, add_fn):
+        parent_code = [int_constant, input_expr, add_fn, Constant(2), add_fn]
+        _, trace = Push().compile_incremental(parent_code, float, checkpoint_interval=2)
+        # Equal but not identical genes are not reused.
+        child_code = [Constant(5)] + parent_code[1:]
+        assert trace.checkpoints_before(child_code) == []
+        child_dag, _ = Push().compile_incremental(child_code, float, trace, checkpoint_interval=2)
+        assert child_dag == Push().compile(child_code, float)
+
+    def test_compile_shares_subtrees(self, int_constant, input_expr, add_fn):
+        push_code = [int_constant, input_expr, add_fn, Constant(5), input_expr, add_fn, add_fn]
+        dag = Push().compile(push_code, float)
+        assert dag.root.children["a"] is dag.root.children["b"]
+        assert Push().compile(push_code, float).root is dag.root
+
+    def test_compile_closure_once(self):
+        seq, local, one, hof = Input("l", List[int]), LocalInput(0), Constant(1), MapExpr()
+        inc = Function(add, _max_numeric)
+        cache = ClosureCache()
+        dag = Push(closure_cache=cache).compile([seq, pvector([local, one, inc]), hof], List[int])
+        assert dag.eval(l=[1, 2]) == [2, 3]
+        assert (cache.hits, cache.misses) == (0, 1)
+        # The same genes in a new code block are found in the cache.
+        code = [seq, pvector([local, one, inc]), pvector([inc]), hof]
+        assert Push(closure_cache=cache).compile(code, List[int]).root is dag.root
+        assert (cache.hits, cache.misses) == (1, 2)
+        # Closures which failed to compile are cached too.
+        assert Push(closure_cache=cache).compile(code, List[int]).root is dag.root
+        assert (cache.hits, cache.misses) == (3, 2)
+        assert len(cache) == 2
+
+
+class TestNodeTable:
+
+    def test_leaf_key(self):
+        assert NodeTable.leaf_key(Constant(1)) == NodeTable.leaf_key(Constant(1))
+        assert NodeTable.leaf_key(Constant(1)) != NodeTable.leaf_key(Constant(True))
+        assert NodeTable.leaf_key(Constant(0.0)) != NodeTable.leaf_key(Constant(-0.0))
+        assert NodeTable.leaf_key(Constant([1])) is None
+
+    def test_intern_leaf(self):
+        table = NodeTable()
+        a = table.intern_leaf(Constant(3))
+        assert table.intern_leaf(Constant(3)) is a
+        assert len(table) == 1
+        del a
+        assert len(table) == 0
@@ -0,0 +1,96 @@
+from typing import List
+
+from push4.gp.soup import GeneToken
+from push4.gp.spawn import genome_to_push_code
+from push4.lang.dag import Dag
+from push4.lang.expr import Constant, Input, Function
+from push4.lang.hof import MapExpr
+from push4.lang.push import Push, NodeTable
+from push4.lang.rewrite import Simplifier
+from push4.library.io import print_do, print_tap, _pass_do
+from push4.library.op import add, mul, div, neg, sub, min_, max_, _max_numeric, _pass_through_a
+
+
+def compile_code(push_code, output_type) -> Dag:
+    return Push(node_table=NodeTable()).compile(push_code, output_type)
+
+
+class TestSimplifier:
+
+    def test_fold_constants(self):
+        dag = compile_code([Constant(2), Constant(3), Function(add, _max_numeric), Input("x", int),
+                            Function(mul, _max_numeric)], int)
+        simplified = Simplifier().simplify_dag(dag)
+        assert simplified.to_code() == "mul(x, 5)"
+        assert simplified.eval(x=2) == dag.eval(x=2) == 10
+
+    def test_folded_constant_keeps_reified_type(self):
+        dag = compile_code([Constant(True), Function(neg, _pass_through_a)], bool)
+        simplified = Simplifier().simplify_dag(dag)
+        assert isinstance(simplified.root, Constant)
+        assert simplified.root.value == -1
+        assert simplified.return_type() == bool
+
+    def test_error_is_not_folded(self):
+        dag = compile_code([Constant("a"), Constant(1), Function(print_do, _pass_do)], int)
+        assert Simplifier().simplify_dag(dag) is dag
+
+    def test_identities(self):
+        x, y = Input("x", int), Input("y", float)
+        plus_zero = compile_code([x, Constant(0), Function(add, _max_numeric)], int)
+        assert Simplifier().simplify_dag(plus_zero).root is plus_zero.root.children["b"]
+        times_zero = compile_code([x, Constant(3), Function(add, _max_numeric), Constant(0),
+                                   Function(mul, _max_numeric)], int)
+        assert Simplifier().simplify_dag(times_zero).to_code() == "0"
+        minus_zero = compile_code([Constant(0), y, Function(sub, _max_numeric)], float)
+        assert Simplifier().simplify_dag(minus_zero).to_code() == "y"
+        twice_negated = compile_code([y, Function(neg, _pass_through_a), Function(neg, _pass_through_a)], float)
+        assert Simplifier().simplify_dag(twice_negated).to_code() == "y"
+        # -0.0 + 0 is 0.0, so adding 0 to a float is kept.
+        float_plus_zero = compile_code([y, Constant(0), Function(add, _max_numeric)], float)
+        assert Simplifier().simplify_dag(float_plus_zero) is float_plus_zero
+
+    def test_impure_operand_is_kept(self):
+        printed = [Input("x", int), Constant(1), Function(print_do, _pass_do)]
+        dag = compile_code(printed + [Constant(0), Function(mul, _max_numeric)], int)
+        assert Simplifier().simplify_dag(dag) is dag
+
+    def test_div_by_one_keeps_float_result(self):
+        x, larger = Input("x", int), Function(max_, _max_numeric)
+        dag = compile_code([Constant(1), x, Constant(2.5), larger, Function(div, None)], float)
+        assert dag.to_code() == "div(max_(2.5, x), 1)"
+        simplified = Simplifier().simplify_dag(dag)
+        assert type(simplified.eval(x=7)) is float
+
+    def test_idempotent_impure_operand_is_kept(self):
+        x, tap, smaller = Input("x", int), Function(print_tap, _pass_do), Function(min_, _max_numeric)
+        dag = compile_code([x, tap, x, tap, smaller], int)
+        assert dag.root.children["a"] is dag.root.children["b"]
+        assert Simplifier().simplify_dag(dag) is dag
+        assert dag.eval(x=3) == 3
+        assert dag.stdout() == "33"
+        pure = compile_code([x, Constant(1), Function(add, _max_numeric), x, Constant(1), Function(add, _max_numeric),
+                             smaller], int)
+        assert Simplifier().simplify_dag(pure).to_code() == "add(1, x)"
+
+    def test_rebuilt_nodes_are_shared(self):
+        table = NodeTable()
+        x, divide, plus = Input("x", float), Function(div, None), Function(add, _max_numeric)
+        push_code = [x, Constant(2), Constant(2), Function(sub, _max_numeric), divide, Constant(1), plus]
+        dag = Push(node_table=table).compile(push_code, float)
+        simplifier = Simplifier(table)
+        simplified = simplifier.simplify_dag(dag)
+        assert simplified.to_code() == "add(1, div(0, x))"
+        folded_code = [x, Constant(0), divide, Constant(1), plus]
+        assert simplified.root is Push(node_table=table).compile(folded_code, float).root
+        assert simplifier.simplify_dag(dag).root is simplified.root
+        # The nodes of the compiled program are not modified.
+        assert dag.to_code() == "add(1, div(sub(2, 2), x))"
+
+    def test_hof_body(self):
+        genome = [Input("l", List[int]), GeneToken.OPEN, Constant(1), Constant(1), Function(add, _max_numeric),
+                  Input("x", int), Function(add, _max_numeric), GeneToken.CLOSE]
+        dag = compile_code(genome_to_push_code(genome + [MapExpr()]), List[int])
+        simplified = Simplifier().simplify_dag(dag)
+        assert simplified.to_code() == "map(lambda _0: add(x, 2), l)"
+        assert simplified.eval(l=[1, 2], x=1) == [3, 3]
@@ -0,0 +1,25 @@
+from typing import List, Union, Sequence
+
+import pytypes
+
+from push4.lang import types
+
+
+class TestTypes:
+
+    def test_is_subtype(self):
+        pairs = [(int, float), (bool, int), (str, int), (List[int], List), (List[int], Sequence[int]),
+                 (int, Union[int, str]), (List[str], List[int])]
+        for sub, sup in pairs:
+            assert types.is_subtype(sub, sup) == pytypes.is_subtype(sub, sup)
+            assert types.is_subtype(sub, sup) == pytypes.is_subtype(sub, sup)
+
+    def test_is_subtype_cached(self):
+        types.cache_clear()
+        types.is_subtype(List[int], Sequence[int])
+        types.is_subtype(List[int], Sequence[int])
+        info = types.cache_info()["is_subtype"]
+        assert (info.hits, info.misses) == (1, 1)
+
+    def test_get_Generic_itemtype(self):
+        assert types.get_Generic_itemtype(List[str]) == str
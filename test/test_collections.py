@@ -1,7 +1,10 @@
+from collections import Counter
+
+import numpy as np
 import pytest
 from pyrsistent import v, m
 
-from push4.collections import POMap
+from push4.collections import POMap, DiscreteProbDistrib
 
 
 class TestPOMap:
@@ -49,3 +52,25 @@ class TestPOMap:
         po_map = po_map.add("a", 3)
         assert po_map.keys() == v("a", "b")
         assert po_map.values() == v(3, 2)
+
+
+class TestDiscreteProbDistrib:
+
+    def test_sample(self):
+        distrib = DiscreteProbDistrib().add("a", 1).add("b", 0).add("c", 3)
+        counts = Counter(distrib.sample() for _ in range(4000))
+        assert counts["b"] == 0
+        assert 0.2 < counts["a"] / 4000 < 0.3
+
+    def test_sample_n(self):
+        distrib = DiscreteProbDistrib().add("a", 1).add("b", 0).add("c", 3)
+        ndxs = distrib.sample_n(4000)
+        assert len(ndxs) == 4000
+        assert set(ndxs) == {0, 2}
+        assert 0.2 < np.mean(ndxs == 0) < 0.3
+
+    def test_add_after_sample(self):
+        distrib = DiscreteProbDistrib().add("a", 1)
+        assert distrib.sample() == "a"
+        distrib.add("b", 1000000)
+        assert distrib.sample_n(10).tolist() == [1] * 10